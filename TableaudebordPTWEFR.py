@@ -1,10 +1,19 @@
+import threading
 import pandas as pd
-import numpy as np
-import plotly.graph_objects as go
 import streamlit as st
-import plotly.express as px  # Pour accéder à des palettes de couleurs
 import toml
-import streamlit_authenticator as stauth
+from periodes import cle_selection, options
+from ingestion import dernier_snapshot, empreinte_magasin, ingerer_increment, lister_snapshots, magasin_courant, signature_fichier
+from historique import charger_lignes, comparer, mettre_a_jour_historique, nom_snapshot, reconstituer
+from agregats import RATIOS, construire_cube, indexer_jours, mettre_a_jour_cube, sites_cube
+from anomalies import MODES, colonne_score
+from facteurs import CARBONE, JEU_REFERENCE, appliquer, jeux, lire_facteurs
+from faits import calendrier_faits, cube_faits
+from graphiques import construire_figure
+from memoire import compacter, rapport_memoire
+from moteur import FORMAT_SCORE, INDICATEURS, agreger_sites, charger_faits, charger_snapshot, deriver_donnees, donnees_graphique, format_indicateur, formater_tableau, magasin_initialise, nombre_pages, page_tableau
+from requetes import cube_sql, moteurs
+from vues import config_cache, etat_cache, etat_partage, vue, vue_partagee
 
 st.set_page_config(page_title="Tableau", layout="wide")
 
@@ -47,310 +56,245 @@ def main():
 if __name__ == "__main__":
     main()
 
-# Chargement des données
-df2 = pd.read_csv("data/20260529 Global_streamlit2.csv", sep=";")
-
-# Assurer que la colonne 'Date' est bien au format datetime
-df2['Date'] = pd.to_datetime(df2['Date'], errors='coerce', dayfirst=False)
-
-# Extraire l'année, le mois et le journb
-#df2['Année'] = df2['Date'].dt.year
-#df2['Mois'] = df2['Date'].dt.month
-#df2['Jour'] = df2['Date'].dt.date
-
-df2['Jour'] = pd.to_datetime(df2['Jour'], errors='coerce', dayfirst=False)
-df2['Mois-Abrege'] = df2['Date'].dt.strftime('%b')  # Mois abrégés (ex: Jan, Feb, Mar, etc.)
-df2['Trimestre'] = df2['Année'] * 10 + ((df2['Mois'] - 1) // 3 + 1)
-df2['Mois'] = df2['Année'] * 100 + df2['Mois']
-df2['Semaine'] = df2['Année'] * 100 + df2['Semaine']
-df2['Semaine_Formate'] = df2['Semaine'].apply(lambda x: f"S{int(str(x)[-2:]):02d} {str(x)[:4]}")
-df2['Trimestre_Formate'] = df2['Trimestre'].astype(str).str[:4] + '-Q' + df2['Trimestre'].astype(str).str[4:]
-df2['Mois_Formate'] = df2['Mois'].astype(str).str[:4] + '-' + df2['Mois'].astype(str).str[4:]
-df2 = df2[df2['Année'].isin([2023,2024, 2025, 2026])]
-df2['Empreinte carbone (tCO2)'] = ((df2['Gaz (kWh)'].fillna(0)) / 1000 * 0.181) + ((df2['Electricité (kWh)'].fillna(0)) / 1000 * 0.0338)
+# Chargement des données : dernier export daté de data/ ou Archive/, intégré de façon incrémentale
+# dans le magasin Parquet courant, partitionné par site et année (voir ingestion.py)
+FICHIER_DONNEES = dernier_snapshot('Global')
+MAGASIN = magasin_courant('Global')
+ANNEES = [2023, 2024, 2025, 2026]
+
+# État partagé par toutes les sessions : version de l'export intégrée et cube période × site
+# de tous les indicateurs (chaque choix de la barre latérale n'est qu'une tranche de ce cube)
+@st.cache_resource(show_spinner=False)
+def etat_donnees():
+    return {'verrou': threading.Lock(), 'version': None, 'cube': None}
+
+# Faits des deux pages (sites et machines, voir faits.py) : une seule copie en mémoire pour le processus
+def charger_faits_courants():
+    return charger_faits(MAGASIN, magasin_initialise('Machine'))
+
+# Quand un nouvel export arrive, seules les partitions modifiées sont réécrites dans le magasin
+# et seules les années qu'elles couvrent sont recalculées dans le cube, à partir des faits de site
+def actualiser_cube(version):
+    etat = etat_donnees()
+    with etat['verrou']:
+        if etat['version'] != version:
+            increment = ingerer_increment(version[0], MAGASIN)
+            annees = sorted({annee for site, annee in increment.partitions} & set(ANNEES))
+            faits = charger_faits_courants()
+            if etat['cube'] is None:
+                etat['cube'] = cube_faits(faits, ANNEES)
+            elif annees:
+                # Nouveau cube construit à part puis mis en place d'une seule affectation : les autres
+                # sessions lisent l'ancien ou le nouveau cube, jamais un cube à moitié mis à jour
+                etat['cube'] = mettre_a_jour_cube(etat['cube'], cube_faits(faits, annees), annees)
+            etat['version'] = version
+    return etat['cube']
+
+# Historique adressé par contenu des exports datés (voir historique.py), mis à jour quand
+# un export apparaît ou change : les anciens exports sont reconstitués sans relire leur CSV
+@st.cache_data(max_entries=2, show_spinner=False)
+def preparer_historique(signatures):
+    historique = mettre_a_jour_historique('Global')
+    return historique, charger_lignes(historique)
+
+# Cube d'un export antérieur, construit une seule fois par export
+@st.cache_data(max_entries=4, show_spinner=False)
+def charger_cube_snapshot(nom, signatures):
+    historique, lignes = preparer_historique(signatures)
+    df2 = reconstituer(lignes, historique, nom)
+    return construire_cube(deriver_donnees(compacter(df2[df2['Année'].isin(ANNEES)])))
+
+# Cube de l'export courant agrégé par DuckDB directement sur le magasin Global (voir requetes.py),
+# une seule fois par contenu du magasin
+@st.cache_resource(max_entries=2, show_spinner=False)
+def cube_duckdb(magasin, empreinte):
+    return cube_sql(magasin, ANNEES)
+
+# Cube d'un export avec l'empreinte carbone d'un jeu de facteurs d'émission, calculée une seule fois
+# par export, moteur, jeu et version des facteurs à partir des sommes du cube
+@st.cache_resource(max_entries=8, show_spinner=False)
+def cube_facteurs(nom, version, moteur, jeu, version_facteurs, _cube, _facteurs):
+    return appliquer(_cube, _facteurs, jeu)
+
+# Index journalier d'un cube (jours triés par site), construit une fois par export affiché, moteur et jeu de facteurs
+@st.cache_resource(max_entries=4, show_spinner=False)
+def index_jours(nom, version, moteur, jeu, version_facteurs, _cube):
+    return indexer_jours(_cube['Jour'])
+
+# Occupation mémoire des données décodées de l'export courant (types par défaut / types compacts),
+# et de la table de faits codée en entiers partagée par les deux pages
+@st.cache_data(max_entries=2, show_spinner=False)
+def diagnostic_memoire(magasin, version):
+    return rapport_memoire(charger_snapshot(magasin, 'Global', ANNEES))
+
+# Révisions entre deux exports
+@st.cache_data(max_entries=8, show_spinner=False)
+def charger_revisions(avant, apres, signatures):
+    historique, lignes = preparer_historique(signatures)
+    return comparer(reconstituer(lignes, historique, avant), reconstituer(lignes, historique, apres), 'Global')
+
+version = signature_fichier(FICHIER_DONNEES)
+cube = actualiser_cube(version)
+faits = charger_faits_courants()
+calendrier = calendrier_faits(faits, 'Site', ANNEES)
+signatures = tuple(signature_fichier(chemin) for chemin in lister_snapshots('Global'))
+snapshots = [nom_snapshot(chemin) for chemin, mtime, taille in reversed(signatures)]
+
 # Charger l'image et afficher en haut à gauche
 image = "PT.jpg"  # Remplacez ce chemin par le chemin réel de votre image
 st.image(image)
 
 # Filtrage des données dans Streamlit
 st.sidebar.title("Filtrage des données")
-sites = df2['Site'].unique()
+
+# Export affiché (le plus récent par défaut) et export de comparaison
+snapshot_choice = st.sidebar.selectbox("Export affiché", snapshots, index=0)
+comparaison_choice = st.sidebar.selectbox("Comparer avec l'export", ['Aucun'] + snapshots[1:], index=0)
+
+# Moteur de calcul du cube de l'export courant : faits en mémoire (pandas) ou DuckDB sur le magasin
+# Parquet (proposé si DuckDB est installé), pour comparer les deux moteurs sur les mêmes vues
+moteur_choice = 'pandas'
+if len(moteurs()) > 1:
+    moteur_choice = st.sidebar.radio("Moteur de calcul", moteurs())
+if snapshot_choice != nom_snapshot(FICHIER_DONNEES):
+    cube = charger_cube_snapshot(snapshot_choice, signatures)
+elif moteur_choice == 'DuckDB':
+    cube = cube_duckdb(MAGASIN, empreinte_magasin(MAGASIN))
+
+# Sites de l'export affiché (un ancien export peut ne pas avoir tous les sites du magasin courant)
+sites = sites_cube(cube)
 site_selection = st.sidebar.selectbox('Choisissez un site', ['Global'] + list(sites) + ['Total'])
 
 # Choisir l'énergie à afficher
-energie_choice = st.sidebar.radio("Choisissez l'indicateur", ['Gaz (kWh/kg)', 'Electricité (kWh/kg)','Empreinte carbone (tCO2)', 'Gaz (kWh)', 'Electricité (kWh)', 'PE (kg)'])
+energie_choice = st.sidebar.radio("Choisissez l'indicateur", INDICATEURS)
 
 # Choisir la période de filtrage
-period_choice = st.sidebar.radio("Sélectionner la période", ('Année','Trimestre', 'Mois','Semaine')) #j'ai enlevé le filtre journalier
-
-if site_selection == 'Total' :
-    df2['Site'] = 'Total'
-
-# Calcul des sommes de Gaz et Electricité selon la période choisie
-df_gaz = df2.groupby([period_choice, 'Site'])['Gaz (kWh)'].sum().reset_index()
-df_electricite = df2.groupby([period_choice, 'Site'])['Electricité (kWh)'].sum().reset_index()
-
-# Calcul de la somme de PE (kg) par période et site
-df_pe = df2.groupby([period_choice, 'Site'])['PE (kg)'].sum().reset_index()
-
-# Fusionner df_gaz et df_electricite
-df_merged_gaz_elec = pd.merge(df_gaz, df_electricite, on=[period_choice, 'Site'], suffixes=('_gaz', '_elec'))
-
-# Fusionner le résultat avec df_pe
-df_merged = pd.merge(df_merged_gaz_elec, df_pe, on=[period_choice, 'Site'], suffixes=('_gaz_elec', '_pe'))
-
-# Appliquer la condition selon le choix d'énergie
-
-if energie_choice == "Gaz (kWh/kg)":
-    df_merged['Gaz (kWh/kg)'] = df_merged['Gaz (kWh)'] / df_merged['PE (kg)']
-    df_final = df_merged[[period_choice, 'Site', 'Gaz (kWh/kg)']]
-elif energie_choice == "Electricité (kWh/kg)":
-    df_merged['Electricité (kWh/kg)'] = df_merged['Electricité (kWh)'] / df_merged['PE (kg)']
-    df_final = df_merged[[period_choice, 'Site', 'Electricité (kWh/kg)']]
-
-# Filtrage des données par site
-if site_selection == 'Global':
-    # Si l'énergie choisie est 'Gaz (kWh/kg)' ou 'Electricité (kWh/kg)', utiliser df_final
-    if energie_choice == 'Gaz (kWh/kg)' or energie_choice == 'Electricité (kWh/kg)':
-        df_filtered = df_final
-    else:
-        # Sinon, grouper df2 par période et site, et sommer selon l'énergie choisie
-        df_filtered = df2.groupby([period_choice, 'Site'])[energie_choice].sum().reset_index()
-        
-elif site_selection == 'Total' :
-
-    if energie_choice == 'Gaz (kWh/kg)' or energie_choice == 'Electricité (kWh/kg)':
-        # Si l'énergie choisie est 'Gaz (kWh/kg)' ou 'Electricité (kWh/kg)', filtrer df_final selon le site sélectionné
-        df_filtered = df_final
-    else:
-        # Sinon, filtrer df2 selon le site sélectionné
-        df2['Site'] = 'Total'
-        df_filtered = df2.groupby([period_choice, 'Site'])[energie_choice].sum().reset_index()
-
-elif energie_choice == 'Gaz (kWh/kg)' or energie_choice == 'Electricité (kWh/kg)':
-    # Si l'énergie choisie est 'Gaz (kWh/kg)' ou 'Electricité (kWh/kg)', filtrer df_final selon le site sélectionné
-    df_filtered = df_final[df_final['Site'] == site_selection]
+period_choice = st.sidebar.radio("Sélectionner la période", ('Année','Trimestre', 'Mois','Semaine', 'Jour'))
 
-else:
-    # Sinon, filtrer df2 selon le site sélectionné
-    df_filtered = df2[df2['Site'] == site_selection]
- 
-# Filtrage selon la période choisie
+# Diagnostic de l'occupation mémoire (types par défaut / types compacts)
+diagnostic_choice = st.sidebar.checkbox("Diagnostic mémoire", value=False)
+
+# Choix de la plage de périodes
 if period_choice == 'Année':
-    start_year = st.sidebar.selectbox("Année de début", sorted(df2['Année'].unique()),index=0)
-    end_year = st.sidebar.selectbox("Année de fin", sorted(df2['Année'].unique()),index=1)
-    df_filtered = df_filtered[(df_filtered['Année'] >= start_year) & (df_filtered['Année'] <= end_year)]
+    start_year = st.sidebar.selectbox("Année de début", sorted(calendrier['Année'].unique()),index=0)
+    end_year = st.sidebar.selectbox("Année de fin", sorted(calendrier['Année'].unique()),index=1)
+    plage = (start_year, end_year)
 elif period_choice == 'Trimestre' :
     start_year_quarter = st.sidebar.selectbox(
     "Sélectionner le trimestre de début",
-    sorted(df2['Trimestre_Formate'].unique(), key=lambda x: (int(x[:4]), int(x[-1]))), 
+    options(calendrier['Trimestre'], 'Trimestre'), 
     index=4
     )
     end_year_quater = st.sidebar.selectbox(
     "Sélectionner le trimestre de début",
-    sorted(df2['Trimestre_Formate'].unique(), key=lambda x: (int(x[:4]), int(x[-1]))), 
+    options(calendrier['Trimestre'], 'Trimestre'), 
     index=7
     )
-    # Convertir la valeur sélectionnée en format d'origine (YYYYMM)
-    start_year_month_raw = int(start_year_quarter.replace('-Q', ''))
-    end_year_month_raw = int(end_year_quater.replace('-Q', ''))
-    df_filtered = df_filtered[(df_filtered['Trimestre'] >= start_year_month_raw) & (df_filtered['Trimestre'] <= end_year_month_raw)]
+    # Convertir la valeur sélectionnée en format d'origine (AAAAT)
+    plage = (cle_selection(start_year_quarter, 'Trimestre'), cle_selection(end_year_quater, 'Trimestre'))
 elif period_choice == 'Mois':
     # Choisir l'année et le mois de début et de fin
-    start_year_month = st.sidebar.selectbox("Sélectionner le mois de début", sorted(df2['Mois_Formate'].unique()),index=12)
-    end_year_month = st.sidebar.selectbox("Sélectionner le mois de fin", sorted(df2['Mois_Formate'].unique()),index=20)
-    # Convertir la valeur sélectionnée en format d'origine (YYYYMM)
-    start_year_month_raw = int(start_year_month.replace('-', ''))
-    end_year_month_raw = int(end_year_month.replace('-', ''))
-    df_filtered = df_filtered[(df_filtered['Mois'] >= start_year_month_raw) & (df_filtered['Mois'] <= end_year_month_raw)]
+    start_year_month = st.sidebar.selectbox("Sélectionner le mois de début", options(calendrier['Mois'], 'Mois'),index=12)
+    end_year_month = st.sidebar.selectbox("Sélectionner le mois de fin", options(calendrier['Mois'], 'Mois'),index=20)
+    # Convertir la valeur sélectionnée en format d'origine (AAAAMM)
+    plage = (cle_selection(start_year_month, 'Mois'), cle_selection(end_year_month, 'Mois'))
 elif period_choice == 'Semaine':
-    start_week = st.sidebar.selectbox("Sélectionner la semaine de début", sorted(df2['Semaine_Formate'].unique(), key=lambda x: (int(x.split()[1]), int(x.split()[0][1:]))),index=52)
-    end_week = st.sidebar.selectbox("Sélectionner la semaine de fin", sorted(df2['Semaine_Formate'].unique(), key=lambda x: (int(x.split()[1]), int(x.split()[0][1:]))), index=90)
-    start_week_raw = int(start_week.split()[1]) * 100 + int(start_week.split()[0][1:])
-    end_week_raw = int(end_week.split()[1]) * 100 + int(end_week.split()[0][1:])
-
-    df_filtered = df_filtered[(df_filtered['Semaine'] >= start_week_raw) & (df_filtered['Semaine'] <= end_week_raw)]
+    start_week = st.sidebar.selectbox("Sélectionner la semaine de début", options(calendrier['Semaine'], 'Semaine'),index=52)
+    end_week = st.sidebar.selectbox("Sélectionner la semaine de fin", options(calendrier['Semaine'], 'Semaine'), index=90)
+    plage = (cle_selection(start_week, 'Semaine'), cle_selection(end_week, 'Semaine'))
 else:
     start_day = pd.to_datetime(st.sidebar.date_input("Jour de début", pd.to_datetime('2024-01-01')))
     end_day = pd.to_datetime(st.sidebar.date_input("Jour de fin", pd.to_datetime('2024-12-31')))
-    df_filtered = df_filtered[(df_filtered['Jour'] >= start_day) & (df_filtered['Jour'] <= end_day)]
-
-# Agrégation des données
-if energie_choice == 'Gaz (kWh/kg)' or energie_choice == 'Electricité (kWh/kg)':
-    energie_col = df_filtered
-    aggregation_method = 'median'
-elif energie_choice == 'Gaz (kWh)' or energie_choice == 'Electricité (kWh)' or energie_choice == 'Empreinte carbone (tCO2)' :
-    energie_col = energie_choice
-    aggregation_method = 'sum'
-else:
-    energie_col = energie_choice
-    aggregation_method = 'sum'
-
-if period_choice == 'Année':
-    if aggregation_method == 'median':
-        df_grouped = df_filtered
-    else:
-        df_grouped = df_filtered.groupby(['Année', 'Site'])[energie_col].sum().reset_index()
-
-elif period_choice == 'Trimestre' :
-    if aggregation_method == 'median':
-        df_grouped = df_filtered
-    else:
-        df_grouped = df_filtered.groupby(['Trimestre', 'Site'])[energie_col].sum().reset_index()
-
-elif period_choice == 'Mois':
-    if aggregation_method == 'median':
-        df_grouped = df_filtered
-    else:
-        df_grouped = df_filtered.groupby(['Mois', 'Site'])[energie_col].sum().reset_index()
-elif period_choice == 'Semaine':  # Ajout de la condition pour la semaine
-    if aggregation_method == 'median':
-        df_grouped = df_filtered
-    else:
-        df_grouped = df_filtered.groupby(['Semaine', 'Site'])[energie_col].sum().reset_index()
-else:
-    if aggregation_method == 'median':
-        df_grouped = df_filtered
-    else:
-        df_grouped = df_filtered.groupby(['Jour', 'Site'])[energie_col].sum().reset_index()
-
-# Créer une palette de couleurs distinctes
-color_palette = px.colors.qualitative.Light24  # Palette de couleurs pré-définie
+    plage = (start_day, end_day)
+
+# Valeurs aberrantes des ratios journaliers, détectées à l'intégration de l'export :
+# masquées sur le graphique ou marquées d'une croix rouge (le tableau garde toutes les valeurs, avec leur score)
+anomalies_choice = 'Masquer'
+if period_choice == 'Jour' and energie_choice in RATIOS:
+    anomalies_choice = st.sidebar.radio("Anomalies", MODES)
+
+# Jeu de facteurs d'émission de l'empreinte carbone (référence ou scénario, voir data/facteurs_emission.csv) :
+# changer de jeu ne fait que reprendre le cube correspondant, calculé une seule fois
+facteurs = lire_facteurs()
+jeu_choice = JEU_REFERENCE
+if energie_choice == CARBONE:
+    jeu_choice = st.sidebar.selectbox("Facteurs d'émission", jeux(facteurs))
+    st.sidebar.caption(f"Version des facteurs : {facteurs.version}")
+cube = cube_facteurs(snapshot_choice, version, moteur_choice, jeu_choice, facteurs.version, cube, facteurs)
+
+# Vue affichée : données groupées, figure et tableau mis en forme de la sélection
+def calculer_vue():
+    # Tranche du cube (déjà agrégé par période et par site) pour le site, l'indicateur et la plage choisis ;
+    # les jours sont découpés par recherche dichotomique dans l'index journalier
+    index = index_jours(snapshot_choice, version, moteur_choice, jeu_choice, facteurs.version, cube) if period_choice == 'Jour' else None
+    df_grouped = agreger_sites(cube, site_selection, energie_choice, period_choice, plage, index)
+
+    # Graphique construit en une seule passe sur les données groupées (une série par site) ;
+    # si un seul site est sélectionné, la série est affichée en bleu
+    fig = construire_figure(donnees_graphique(df_grouped, energie_choice, anomalies_choice), period_choice, 'Site', energie_choice,
+                            couleur_unique=site_selection != 'Global', evidence=anomalies_choice == 'Mettre en évidence')
+
+    # Mise à jour des axes et titres
+    fig.update_layout(
+        barmode='group',
+        title=f'Consommation d\'énergie pour {site_selection}',
+        title_font=dict(size=24),  # Taille du titre
+        xaxis_title_font=dict(size=18),  # Taille du titre de l'axe X
+        xaxis=dict(
+            color='white',  # Change la couleur des axes X en blanc
+            type='category',
+            tickfont=dict(size=16),  # Taille des labels des ticks de l'axe X
+        ),
+        yaxis_title=f'Consommation ({energie_choice})',
+        yaxis_title_font=dict(size=18),  # Taille du titre de l'axe Y
+        yaxis=dict(
+            color='white',  # Change la couleur des axes Y en blanc
+            tickfont=dict(size=16),  # Taille des labels des ticks de l'axe Y
+            showgrid=True,  # Afficher la grille
+            gridcolor='white',  # Change la couleur de la grille en blanc
+            zerolinecolor='white',  # Change la couleur de la ligne zéro
+        ),
+        legend_title="Site",
+        height=500,  # Hauteur du graphique
+        width=2000,  # Largeur du graphique
+    )
 
-# Création du graphique avec Plotly
-fig = go.Figure()
+    # Tableau mis en forme, sans l'index
+    return df_grouped, fig, formater_tableau(df_grouped, period_choice, energie_choice)
 
-# Ajouter les sous-graphes avec des couleurs différentes pour chaque site
-for idx, site in enumerate(df_grouped['Site'].unique()):
-    site_data = df_grouped[df_grouped['Site'] == site]
-    
-    # Si un seul site est sélectionné, appliquer la couleur bleue
-    if site_selection != 'Global' and 'Total'  and len(df_grouped['Site'].unique()) == 1:
-        color = 'Lightblue'
-    else:
-        color = color_palette[idx % len(color_palette)]  # Assurer une couleur unique pour chaque site
-
-    if period_choice == 'Année':
-        fig.add_trace(go.Bar(
-            x=site_data['Année'],
-            y=site_data[energie_choice],
-            name=site,
-            marker=dict(color=color)
-        ))
-    
-    elif period_choice == 'Mois':
-        # Mise en forme de la semaine pour afficher mois et année (ex : 202301 -> Janvier 2023)
-        site_data['Mois'] = site_data['Mois'].apply(
-            lambda x: f"{pd.to_datetime(str(x), format='%Y%m').strftime('%B %Y')}" if period_choice == 'Mois' else x
-        )
-        # Trier les données par mois (dans l'ordre croissant des dates)
-        site_data['Mois'] = pd.to_datetime(site_data['Mois'], format='%B %Y')
-        site_data = site_data.sort_values(by='Mois')
-        # Ajout des traces pour le graphique
-        fig.add_trace(go.Bar(
-            x=site_data['Mois'].dt.strftime('%B %Y'),  # Reformater le mois pour l'affichage
-            y=site_data[energie_choice],
-            name=site,
-            marker=dict(color=color)
-        ))
-
-    elif period_choice == 'Trimestre':
-        # Création du format Q1 2024, Q2 2024, ...
-        site_data['Trimestre_Formate'] = site_data['Trimestre'].apply(
-            lambda x: f"Q{(int(str(x)[-1]))} {str(x)[:4]}"
-        )
-
-        # Associer chaque trimestre à une date de référence pour le tri (ex: Q1 -> 15 février de l'année)
-        site_data['Trimestre_Sort'] = pd.to_datetime(
-            site_data['Trimestre'].apply(lambda x: f"{str(x)[:4]}-{(int(str(x)[-1]) - 1) * 3 + 2}-15"),
-            format='%Y-%m-%d'
-        )
-
-        # Trier les données par trimestre (ordre chronologique)
-        site_data = site_data.sort_values(by='Trimestre_Sort')
-
-        # Ajout des traces pour le graphique
-        fig.add_trace(go.Bar(
-            x=site_data['Trimestre_Formate'],  # Affichage sous "Q1 2024"
-            y=site_data[energie_choice],
-            name=site,
-            marker=dict(color=color)
-        ))
-
-    elif period_choice == 'Semaine':
-        site_data['Semaine'] = site_data['Semaine'].apply(
-            lambda x: f"S{int(str(x)[-2:]):02d} {str(x)[:4]}" if period_choice == 'Semaine' else x
-        )
-        fig.add_trace(go.Bar(
-            x=site_data['Semaine'],
-            y=site_data[energie_choice],
-            name=site,
-            marker=dict(color=color)
-        ))
-    else:
-        if energie_choice == 'Gaz (kWh/kg)':
-            site_data = site_data[site_data[energie_choice] < 15]
-        if energie_choice == 'Electricité (kWh/kg)':
-            site_data = site_data[site_data[energie_choice] < 7]
-        site_data['Jour'] = site_data['Jour'].apply(
-            lambda x: f"{str(x)[:10]}" if period_choice == 'Jour' else x
-        )
-        fig.add_trace(go.Bar(
-            x=site_data['Jour'],
-            y=site_data[energie_choice],
-            name=site,
-            marker=dict(color=color)
-        ))
-
-# Mise à jour des axes et titres
-fig.update_layout(
-    barmode='group',
-    title=f'Consommation d\'énergie pour {site_selection}',
-    title_font=dict(size=24),  # Taille du titre
-    xaxis_title_font=dict(size=18),  # Taille du titre de l'axe X
-    xaxis=dict(
-        color='white',  # Change la couleur des axes X en blanc
-        type='category',
-        tickfont=dict(size=16),  # Taille des labels des ticks de l'axe X
-    ),
-    yaxis_title=f'Consommation ({energie_choice})',
-    yaxis_title_font=dict(size=18),  # Taille du titre de l'axe Y
-    yaxis=dict(
-        color='white',  # Change la couleur des axes Y en blanc
-        tickfont=dict(size=16),  # Taille des labels des ticks de l'axe Y
-        showgrid=True,  # Afficher la grille
-        gridcolor='white',  # Change la couleur de la grille en blanc
-        zerolinecolor='white',  # Change la couleur de la ligne zéro
-    ),
-    legend_title="Site",
-    height=500,  # Hauteur du graphique
-    width=2000,  # Largeur du graphique
-)
+# Les vues déjà affichées dans la session (clé : export, sélection et plage) sont servies sans recalcul ;
+# sinon la vue est reprise du cache partagé par les sessions, vidé à l'arrivée d'un nouvel export
+cle_vue = (snapshot_choice, version, moteur_choice, site_selection, energie_choice, period_choice, plage, anomalies_choice, jeu_choice, facteurs.version)
+df_grouped, fig, tableau = vue(st.session_state, cle_vue,
+                                lambda: vue_partagee('Global', version, cle_vue, calculer_vue, *config_cache()))
 
 # Affichage du graphique dans Streamlit
-if period_choice in df_grouped.columns:
-    df_grouped[period_choice] = df_grouped[period_choice].apply(
-        lambda x: f"{pd.to_datetime(str(x), format='%Y%m').strftime('%B %Y')}" if period_choice == 'Mois' else
-                  f"{x:,.0f}".replace(',', '') if period_choice == 'Année' else
-                  f"S{int(str(x)[-2:]):02d} {str(x)[:4]}" if period_choice == 'Semaine' else
-                  f"{str(x)[:10]}" if period_choice == 'Jour' else
-                  f"Q{str(x)[-1]} {str(x)[:4]}" if period_choice == 'Trimestre' else x
-                
-
-    )
-if energie_choice in df_grouped.columns:
-    df_grouped[energie_choice] = df_grouped[energie_choice].apply(
-        lambda x: "" if (x <= 0 or pd.isna(x) or x == float('inf') or x == float('-inf'))
-                  else f"{x:,.0f}".replace(',', '') if energie_choice in ['Gaz (kWh)', 'Electricité (kWh)', 'PE (kg)'] 
-                  else f"{x:,.2f}".replace(',', '')
-    )
-
-
 st.plotly_chart(fig)
 
-# Réinitialiser l'index et ne pas l'afficher
-df_grouped_reset = df_grouped.reset_index(drop=True)
-
-# Afficher sans l'index
-st.write(df_grouped_reset)
-
+# Tableau numérique (triable) sans l'index, dans une grille qui ne dessine que les lignes visibles ;
+# le format des nombres et le masquage des valeurs vides sont appliqués par le navigateur
+pages_tableau = nombre_pages(len(tableau))
+page = st.number_input("Page du tableau", min_value=1, max_value=pages_tableau, value=1) if pages_tableau > 1 else 1
+st.dataframe(page_tableau(tableau, page), hide_index=True,
+             column_config={energie_choice: st.column_config.NumberColumn(format=format_indicateur(energie_choice)),
+                            colonne_score(energie_choice): st.column_config.NumberColumn(format=FORMAT_SCORE)})
+
+# Valeurs révisées entre l'export de comparaison et l'export affiché
+if comparaison_choice != 'Aucun':
+    revisions = charger_revisions(comparaison_choice, snapshot_choice, signatures)
+    if site_selection not in ('Global', 'Total'):
+        revisions = revisions[revisions['Site'] == site_selection]
+    st.subheader(f"Révisions entre {comparaison_choice} et {snapshot_choice}")
+    st.write(revisions.groupby(['Changement', 'Indicateur']).size().rename('Valeurs').reset_index())
+    st.dataframe(revisions, hide_index=True)
+
+# Octets par colonne avec les types par défaut et avec les types compacts
+if diagnostic_choice:
+    st.subheader("Diagnostic mémoire")
+    st.dataframe(diagnostic_memoire(MAGASIN, version), hide_index=True)
+    st.subheader("Table de faits des deux pages (codes entiers)")
+    st.dataframe(rapport_memoire(faits.faits), hide_index=True)
+    st.subheader("Cache des vues de la session")
+    st.write(etat_cache(st.session_state))
+    st.subheader("Cache des vues partagé entre les sessions")
+    st.write(etat_partage())
@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+
+from anomalies import colonne_anomalie, colonne_score, marquer
+from facteurs import CARBONE, carbone, lire_facteurs
+from periodes import annee_periode
+
+# Granularités disponibles (nom de la colonne de période dans le DataFrame dérivé)
+PERIODES = ['Année', 'Trimestre', 'Mois', 'Semaine', 'Jour']
+
+# Mesures additives sommées par période et par site (l'empreinte carbone est calculée sur les sommes,
+# avec les facteurs d'émission de chaque site et de chaque année, voir facteurs.py)
+SOMMES = ['Gaz (kWh)', 'Electricité (kWh)', 'PE (kg)']
+
+# Sommes conditionnelles de la page Machine : gaz des lignes où PE > 0, PE des lignes où gaz > 0
+SOMMES_MACHINE = {'Gaz (kWh)': ('Gaz (kWh)', 'PE (kg)'), 'PE (kg)': ('PE (kg)', 'Gaz (kWh)')}
+
+# Ratios recalculés à partir des sommes (numérateur / PE)
+RATIOS = {'Gaz (kWh/kg)': 'Gaz (kWh)', 'Electricité (kWh/kg)': 'Electricité (kWh)'}
+
+
+# Agrégation en une seule passe groupée de toutes les mesures :
+# - sommes : colonnes sommées telles quelles
+# - conditionnelles : {nom: (mesure, condition)} = somme de la mesure sur les lignes où condition > 0
+# Comme la jointure interne des anciennes sommes filtrées, un groupe n'est gardé que s'il a
+# au moins une ligne retenue pour chaque somme conditionnelle.
+# Les mesures sont sommées en float64 même si elles sont stockées en float32.
+def agreger(df, cles, sommes=(), conditionnelles=None):
+    colonnes = {cle: df[cle] for cle in cles}
+    colonnes.update({mesure: df[mesure].astype('float64') for mesure in sommes})
+    lignes = []
+    for nom, (mesure, condition) in (conditionnelles or {}).items():
+        retenue = df[condition] > 0
+        colonnes[nom] = df[mesure].astype('float64').where(retenue)
+        colonnes[f'_lignes {nom}'] = retenue
+        lignes.append(f'_lignes {nom}')
+
+    resultat = pd.DataFrame(colonnes).groupby(list(cles), observed=True).sum().reset_index()
+    if lignes:
+        resultat = resultat[(resultat[lignes] > 0).all(axis=1)].drop(columns=lignes)
+    return resultat
+
+
+def ajouter_ratios(df):
+    for ratio, mesure in RATIOS.items():
+        df[ratio] = df[mesure] / df['PE (kg)']
+    return df
+
+
+# Valeurs aberrantes des ratios journaliers de chaque site (et du total)
+def marquer_jours(table):
+    return marquer(table, ['Site'], 'Jour', list(RATIOS))
+
+
+# Cube période × site : pour chaque granularité, une table des sommes et des ratios par site,
+# suivie des lignes 'Total' (tous sites confondus). Construit une seule fois par export,
+# avec l'empreinte carbone du jeu de facteurs de référence et les scores et indicateurs d'anomalie
+# des ratios journaliers.
+def construire_cube(df2, periodes=PERIODES):
+    return assembler_cube({periode: (agreger(df2, [periode, 'Site'], SOMMES), agreger(df2, [periode], SOMMES))
+                           for periode in periodes})
+
+
+# Cube construit lot par lot (lots de lignes dérivées) : les sommes de chaque lot sont mises de côté
+# puis regroupées avec les précédentes dès qu'elles dépassent la taille des sommes déjà regroupées.
+# La mémoire dépend de la taille du cube et d'un lot, pas du nombre total de lignes.
+def construire_cube_par_lots(lots, periodes=PERIODES):
+    partielles = {periode: ([], []) for periode in periodes}
+    for df2 in lots:
+        for periode in periodes:
+            par_site, total = partielles[periode]
+            par_site.append(agreger(df2, [periode, 'Site'], SOMMES))
+            total.append(agreger(df2, [periode], SOMMES))
+            if sum(len(sommes) for sommes in par_site[1:]) > len(par_site[0]):
+                partielles[periode] = ([cumuler(par_site, [periode, 'Site'])], [cumuler(total, [periode])])
+    return assembler_cube({periode: (cumuler(par_site, [periode, 'Site']), cumuler(total, [periode]))
+                           for periode, (par_site, total) in partielles.items()})
+
+
+# Regroupement de sommes partielles (une seule table est rendue telle quelle)
+def cumuler(partielles, cles):
+    if len(partielles) == 1:
+        return partielles[0]
+    return agreger(pd.concat(partielles, ignore_index=True), cles, SOMMES)
+
+
+# Tables du cube à partir des sommes par site et des sommes totales de chaque période
+def assembler_cube(sommes):
+    cube = {}
+    facteurs = lire_facteurs()
+    for periode, (par_site, total) in sommes.items():
+        total.insert(1, 'Site', 'Total')
+        table = pd.concat([par_site, total], ignore_index=True)
+        table[CARBONE] = carbone(table, periode, facteurs)
+        cube[periode] = ajouter_ratios(table)
+    if 'Jour' in cube:
+        marquer_jours(cube['Jour'])
+    return cube
+
+
+# Mise à jour du cube après une ingestion incrémentale : les lignes des années touchées sont
+# remplacées par celles d'un cube recalculé sur ces seules années (tous les sites),
+# le reste de l'historique n'est pas recalculé (sauf les anomalies journalières, dont les fenêtres
+# glissantes chevauchent les années voisines). Le cube d'origine n'est pas modifié : un nouveau cube
+# est renvoyé.
+def mettre_a_jour_cube(cube, sous_cube, annees):
+    nouveau = {}
+    for periode, table in cube.items():
+        conservees = table[~annee_periode(table[periode], periode).isin(annees)]
+        table = pd.concat([conservees, sous_cube[periode]], ignore_index=True)
+        est_total = table['Site'] == 'Total'
+        nouveau[periode] = pd.concat([
+            table[~est_total].sort_values([periode, 'Site']),
+            table[est_total].sort_values(periode),
+        ], ignore_index=True)
+    if 'Jour' in nouveau:
+        marquer_jours(nouveau['Jour'])
+    return nouveau
+
+
+# Colonnes d'une vue : période, site, indicateur et, s'ils ont été calculés, le score et l'indicateur
+# d'anomalie
+def colonnes_vue(table, periode, indicateur):
+    anomalie = [colonne_score(indicateur), colonne_anomalie(indicateur)]
+    return [periode, 'Site', indicateur] + [colonne for colonne in anomalie if colonne in table.columns]
+
+
+# Tranche du cube pour une sélection de la barre latérale :
+# 'Global' = tous les sites côte à côte, 'Total' = somme des sites, sinon un seul site
+def extraire(cube, periode, site, indicateur):
+    table = cube[periode]
+    if site == 'Global':
+        masque = table['Site'] != 'Total'
+    else:
+        masque = table['Site'] == site
+    return table.loc[masque, colonnes_vue(table, periode, indicateur)]
+
+
+# Sites présents dans un cube (hors 'Total'), triés : ceux de l'export affiché, sur les années chargées
+def sites_cube(cube):
+    sites = cube['Année']['Site'].astype(str)
+    return sorted(sites[sites != 'Total'].unique())
+
+
+# Index journalier du cube : pour chaque site, 'Total' et 'Global' (tous les sites), les jours
+# triés et les lignes correspondantes, pour découper une plage de dates par recherche dichotomique
+def indexer_jours(table):
+    index = {site: groupe for site, groupe in table.groupby('Site', sort=False)}
+    index['Global'] = table[table['Site'] != 'Total']
+    return {site: (groupe['Jour'].to_numpy(), groupe.reset_index(drop=True)) for site, groupe in index.items()}
+
+
+# Plage de dates [debut, fin] d'un site, sans masque sur toute la table journalière ; un site absent
+# du cube (sans jour dans l'export affiché) donne une tranche vide, comme pour les autres périodes
+def extraire_jours(index, site, indicateur, debut, fin):
+    if site not in index:
+        jours, table = index['Global']
+        return table.iloc[:0][colonnes_vue(table, 'Jour', indicateur)]
+    jours, table = index[site]
+    i = np.searchsorted(jours, np.datetime64(debut, 'ns'), side='left')
+    j = np.searchsorted(jours, np.datetime64(fin, 'ns'), side='right')
+    return table.iloc[i:j][colonnes_vue(table, 'Jour', indicateur)]
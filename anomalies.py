@@ -0,0 +1,65 @@
+import numpy as np
+
+# Détection des valeurs aberrantes, calculée une seule fois quand les données sont intégrées :
+# pour chaque série (un site, ou un couple site / machine), écart de chaque valeur à la médiane
+# glissante, rapporté à l'écart absolu médian (MAD) glissant. Le score est un z-score robuste ;
+# les lignes au-delà du seuil sont signalées. Les lignes sans valeur finie (pas de production : ratio
+# infini ou indéfini) forment un état à part : elles n'ont pas de score, ne sont pas signalées et
+# n'entrent pas dans les fenêtres, qui ne comptent que les valeurs finies de la série.
+
+# Fenêtres glissantes centrées, en nombre de valeurs finies de la série
+FENETRES = {'Jour': 29, 'Semaine': 13}
+
+# Nombre minimal de valeurs dans la fenêtre pour calculer un score
+MINIMUM_VALEURS = 5
+
+SEUIL = 5.0
+
+# Le MAD multiplié par 1.4826 estime l'écart-type d'une loi normale ; le dénominateur est au moins
+# 1 % de la médiane, pour qu'une série presque constante ne signale pas le moindre écart
+FACTEUR_MAD = 1.4826
+PLANCHER = 0.01
+
+# Modes d'affichage des lignes signalées
+MODES = ['Masquer', 'Mettre en évidence', 'Afficher']
+
+
+def colonne_score(indicateur):
+    return f'Score {indicateur}'
+
+
+def colonne_anomalie(indicateur):
+    return f'Anomalie {indicateur}'
+
+
+# Médiane glissante centrée de chaque série (lignes déjà triées par série puis par période)
+def _mediane_glissante(valeurs, series, fenetre):
+    mediane = valeurs.groupby(series, observed=True, sort=False).rolling(fenetre, center=True, min_periods=MINIMUM_VALEURS).median()
+    return mediane.reset_index(level=list(range(len(series))), drop=True)
+
+
+# Ajout des colonnes 'Score <indicateur>' (float32, NaN sans valeur finie ou sans assez de voisines)
+# et 'Anomalie <indicateur>' (booléen) à une table d'une ligne par série et par période,
+# dans l'ordre d'origine des lignes
+def marquer(table, series, periode, indicateurs):
+    ordonnee = table.sort_values(series + [periode], kind='stable')
+    for indicateur in indicateurs:
+        valeurs = ordonnee[indicateur].astype('float64')
+        valeurs = valeurs[np.isfinite(valeurs)]
+        cles = [ordonnee.loc[valeurs.index, serie] for serie in series]
+        mediane = _mediane_glissante(valeurs, cles, FENETRES[periode])
+        ecarts = (valeurs - mediane).abs()
+        mad = _mediane_glissante(ecarts, cles, FENETRES[periode])
+        score = (ecarts / np.maximum(FACTEUR_MAD * mad, PLANCHER * mediane.abs())).reindex(table.index)
+        table[colonne_score(indicateur)] = score.astype('float32')
+        table[colonne_anomalie(indicateur)] = score > SEUIL
+    return table
+
+
+# Lignes d'une vue selon le mode d'affichage : 'Masquer' retire les lignes signalées,
+# les autres modes les gardent ('Mettre en évidence' les marque sur la figure)
+def filtrer_anomalies(df, indicateur, mode):
+    colonne = colonne_anomalie(indicateur)
+    if mode != 'Masquer' or colonne not in df.columns:
+        return df
+    return df[~df[colonne]]
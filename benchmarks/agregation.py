@@ -0,0 +1,77 @@
+# Micro-benchmark de l'agrégation : ancienne chaîne groupby/merge contre agreger() en une passe,
+# sur le dernier export et sur une version synthétique 10× plus grande (sites dupliqués).
+# Lancer depuis la racine du dépôt : python benchmarks/agregation.py
+import os
+import sys
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agregats import SOMMES, SOMMES_MACHINE, agreger
+from ingestion import dernier_snapshot, lire_csv
+
+REPETITIONS = 20
+
+
+def preparer_global():
+    df2 = lire_csv(dernier_snapshot('Global')).to_pandas()
+    df2 = df2[df2['Année'].isin([2023, 2024, 2025, 2026])].copy()
+    df2['Trimestre'] = df2['Année'] * 10 + ((df2['Mois'] - 1) // 3 + 1)
+    df2['Mois'] = df2['Année'] * 100 + df2['Mois']
+    df2['Semaine'] = df2['Année'] * 100 + df2['Semaine']
+    df2['Empreinte carbone (tCO2)'] = ((df2['Gaz (kWh)'].fillna(0)) / 1000 * 0.181) + ((df2['Electricité (kWh)'].fillna(0)) / 1000 * 0.0338)
+    return df2
+
+
+def preparer_machine():
+    df2 = lire_csv(dernier_snapshot('Machine')).to_pandas()
+    df2 = df2[df2['Année'].isin([2023, 2024, 2025])].copy()
+    df2['Mois'] = df2['Année'] * 100 + df2['Mois']
+    df2['Semaine'] = df2['Année'] * 100 + df2['Semaine']
+    return df2
+
+
+# Copie des données sous n noms de sites différents
+def multiplier(df2, n):
+    copies = [df2.assign(Site=df2['Site'] + f' #{i}') for i in range(n)]
+    return pd.concat(copies, ignore_index=True)
+
+
+def ancien_global(df2, periode):
+    df_gaz = df2.groupby([periode, 'Site'])['Gaz (kWh)'].sum().reset_index()
+    df_electricite = df2.groupby([periode, 'Site'])['Electricité (kWh)'].sum().reset_index()
+    df_pe = df2.groupby([periode, 'Site'])['PE (kg)'].sum().reset_index()
+    df_merged = pd.merge(df_gaz, df_electricite, on=[periode, 'Site'])
+    return pd.merge(df_merged, df_pe, on=[periode, 'Site'])
+
+
+def ancien_machine(df2, periode):
+    df_gaz = df2[df2['PE (kg)'] > 0].groupby([periode, 'Machine', 'Site'])['Gaz (kWh)'].sum().reset_index()
+    df_pe = df2[df2['Gaz (kWh)'] > 0].groupby([periode, 'Machine', 'Site'])['PE (kg)'].sum().reset_index()
+    return pd.merge(df_gaz, df_pe, on=[periode, 'Machine', 'Site'])
+
+
+def chronometrer(fonction, *args):
+    return min(timeit.repeat(lambda: fonction(*args), number=1, repeat=REPETITIONS)) * 1000
+
+
+def main():
+    jeux = {'Global': preparer_global(), 'Machine': preparer_machine()}
+    print(f"{'Données':<16}{'Lignes':>9}{'Période':>11}{'Ancien (ms)':>13}{'Une passe (ms)':>16}{'Gain':>7}")
+    for taille in (1, 10):
+        for nom, df2 in jeux.items():
+            donnees = multiplier(df2, taille) if taille > 1 else df2
+            for periode in ('Année', 'Mois', 'Semaine'):
+                if nom == 'Global':
+                    ancien = chronometrer(ancien_global, donnees, periode)
+                    nouveau = chronometrer(agreger, donnees, [periode, 'Site'], SOMMES)
+                else:
+                    ancien = chronometrer(ancien_machine, donnees, periode)
+                    nouveau = chronometrer(agreger, donnees, [periode, 'Machine', 'Site'], (), SOMMES_MACHINE)
+                print(f"{nom + f' ×{taille}':<16}{len(donnees):>9}{periode:>11}{ancien:>13.2f}{nouveau:>16.2f}{ancien / nouveau:>6.1f}×")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# Profil de démarrage à froid des pages : chaque page est exécutée dans un nouveau processus
+# (python -X importtime, caches Streamlit vides) avec le banc de test de Streamlit, sans navigateur.
+# Pour chaque page : temps d'import par paquet (propre et cumulé) et temps jusqu'au premier graphique.
+# Avec --budget-ms, le script échoue si une page dépasse le budget de temps jusqu'au premier graphique.
+# Lancer depuis la racine du dépôt :
+#   python benchmarks/demarrage.py --budget-ms 5000 --sortie benchmarks/demarrage.json
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = ['TableaudebordPTWEFR.py', 'pages/Machine.py', 'pages/Evolution.py']
+
+# Ligne de python -X importtime : "import time:  self [us] | cumulative | imported package"
+MOTIF_IMPORT = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+# Exécution d'une page dans le processus courant (appelé dans le processus enfant)
+def executer_page(page):
+    debut = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    application = AppTest.from_file(os.path.join(RACINE, page), default_timeout=600)
+    application.session_state['authenticated'] = True
+    application.run()
+    return {
+        'premier_graphique_ms': round((time.perf_counter() - debut) * 1000, 1),
+        'graphique': len(application.get('plotly_chart')) > 0,
+        'exceptions': [exception.message for exception in application.exception],
+    }
+
+
+# Temps d'import par paquet de premier niveau (pandas, pyarrow, streamlit, modules du dépôt...), en ms :
+# temps propre de tous ses modules, à toutes les profondeurs (quel que soit le module qui l'importe en
+# premier), et temps cumulé de ses imports qui ne sont pas faits par le paquet lui-même (il comprend
+# les paquets qu'il importe). Les paquets sont triés par temps propre.
+def imports_par_paquet(sortie_importtime):
+    lignes = [correspondance for correspondance in map(MOTIF_IMPORT.match, sortie_importtime.splitlines()) if correspondance]
+    paquets, parents = {}, []
+    # -X importtime écrit chaque module après ceux qu'il importe : en ordre inverse, le parent d'une
+    # ligne est la dernière ligne vue de profondeur inférieure
+    for correspondance in reversed(lignes):
+        profondeur = len(correspondance.group(3))
+        nom = correspondance.group(4).split('.')[0]
+        while parents and parents[-1][0] >= profondeur:
+            parents.pop()
+        propre, cumule = paquets.get(nom, (0.0, 0.0))
+        propre += int(correspondance.group(1)) / 1000
+        if not parents or parents[-1][1] != nom:
+            cumule += int(correspondance.group(2)) / 1000
+        paquets[nom] = (propre, cumule)
+        parents.append((profondeur, nom))
+    return dict(sorted(paquets.items(), key=lambda paquet: -paquet[1][0]))
+
+
+def profiler(page):
+    environnement = dict(os.environ, PYTHONPATH=RACINE, PYTHONWARNINGS='ignore')
+    processus = subprocess.run([sys.executable, '-X', 'importtime', os.path.abspath(__file__), '--enfant', page],
+                               cwd=RACINE, env=environnement, capture_output=True, text=True)
+    if processus.returncode != 0:
+        raise RuntimeError(f"{page} : {processus.stderr[-2000:]}")
+    resultat = json.loads(processus.stdout.strip().splitlines()[-1])
+    resultat['imports_ms'] = {nom: {'propre': round(propre, 1), 'cumule': round(cumule, 1)}
+                              for nom, (propre, cumule) in imports_par_paquet(processus.stderr).items()}
+    return resultat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profil de démarrage à froid des pages")
+    parser.add_argument('--pages', nargs='+', default=PAGES)
+    parser.add_argument('--modules', type=int, default=10, help="nombre de paquets affichés par page")
+    parser.add_argument('--budget-ms', type=float, help="temps maximal jusqu'au premier graphique")
+    parser.add_argument('--sortie', help="fichier JSON des résultats")
+    parser.add_argument('--enfant', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.enfant:
+        print(json.dumps(executer_page(args.enfant)))
+        return
+
+    resultats = {}
+    for page in args.pages:
+        resultat = resultats[page] = profiler(page)
+        print(f"{page} : premier graphique en {resultat['premier_graphique_ms']:.0f} ms"
+              + ("" if resultat['graphique'] else " (aucun graphique)")
+              + "".join(f"\n  exception : {exception}" for exception in resultat['exceptions']))
+        print(f"  {'paquet':<28}{'propre':>10}{'cumulé':>12}")
+        for nom, temps in list(resultat['imports_ms'].items())[:args.modules]:
+            print(f"  {nom:<28}{temps['propre']:>7.1f} ms{temps['cumule']:>9.1f} ms")
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, ensure_ascii=False, indent=1)
+
+    if args.budget_ms is not None:
+        depassements = [page for page, resultat in resultats.items()
+                        if resultat['premier_graphique_ms'] > args.budget_ms or not resultat['graphique']]
+        for page in depassements:
+            print(f"Budget dépassé : {page} ({resultats[page]['premier_graphique_ms']:.0f} ms > {args.budget_ms:.0f} ms)")
+        sys.exit(1 if depassements else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# Générateur de données synthétiques au format des exports Global_streamlit et Machine_streamlit,
+# pour mesurer le comportement du tableau de bord avec beaucoup plus de sites, d'années et de machines.
+# Exemple : python benchmarks/generateur.py --sites 50 --annees 10 --machines 150 --dossier /tmp/exports
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Noms de machines : ceux suivis par la page Machine d'abord, puis des noms génériques
+MACHINES_SUIVIES = ['M2', 'R2', 'F4B', 'Rock6']
+
+DERNIERE_ANNEE = 2025
+
+
+def noms_sites(sites):
+    return [f'PTWE{i:03d}' for i in range(sites)]
+
+
+def premiere_annee(annees):
+    return DERNIERE_ANNEE - annees + 1
+
+
+# Export journalier par site : Site;Date;Gaz (kWh);PE (kg);Electricité (kWh);Gaz (kWh/kg);Electricité (kWh/kg);Semaine;Année;Mois;Jour
+def generer_global(sites, annees, graine=0):
+    rng = np.random.default_rng(graine)
+    jours = pd.date_range(f'{premiere_annee(annees)}-01-01', f'{DERNIERE_ANNEE}-12-31', freq='D')
+    site = np.repeat(noms_sites(sites), len(jours))
+    date = np.tile(jours.to_numpy(), sites)
+    n = len(date)
+
+    # Production avec des jours d'arrêt, consommations proportionnelles avec du bruit
+    pe = rng.gamma(4.0, 2500.0, n) * (rng.random(n) > 0.15)
+    gaz = pe * rng.normal(3.5, 0.4, n) * (rng.random(n) > 0.02)
+    electricite = pe * rng.normal(0.6, 0.1, n)
+    electricite[rng.random(n) < 0.05] = np.nan
+
+    calendrier = pd.DatetimeIndex(date)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.DataFrame({
+            'Site': site,
+            'Date': calendrier.strftime('%Y-%m-%d'),
+            'Gaz (kWh)': gaz.round(3),
+            'PE (kg)': pe.round(3),
+            'Electricité (kWh)': electricite.round(3),
+            'Gaz (kWh/kg)': gaz / pe,
+            'Electricité (kWh/kg)': electricite / pe,
+            'Semaine': calendrier.isocalendar().week.to_numpy(),
+            'Année': calendrier.year,
+            'Mois': calendrier.month,
+            'Jour': calendrier.strftime('%Y-%m-%d'),
+        })
+
+
+# Export hebdomadaire par machine : Site;Année;Semaine;Mois;Machine;Gaz (kWh);PE (kg)
+# Les machines sont réparties à tour de rôle entre les sites
+def generer_machine(sites, annees, machines, graine=0):
+    rng = np.random.default_rng(graine)
+    noms = MACHINES_SUIVIES + [f'M{i}' for i in range(100, 100 + max(0, machines - len(MACHINES_SUIVIES)))]
+    parc = pd.DataFrame({'Site': np.array(noms_sites(sites))[np.arange(machines) % sites], 'Machine': noms[:machines]})
+
+    lundis = pd.date_range(f'{premiere_annee(annees)}-01-01', f'{DERNIERE_ANNEE}-12-31', freq='W-MON')
+    semaines = pd.DataFrame({
+        'Année': lundis.year,
+        'Semaine': lundis.isocalendar().week.to_numpy(),
+        'Mois': lundis.month,
+    })
+    df = parc.merge(semaines, how='cross')
+    n = len(df)
+    pe = rng.gamma(3.0, 1500.0, n) * (rng.random(n) > 0.1)
+    gaz = pe * rng.normal(3.5, 0.5, n) * (rng.random(n) > 0.05)
+    df['Gaz (kWh)'] = gaz.round(3)
+    df['PE (kg)'] = pe.round(3)
+    return df[['Site', 'Année', 'Semaine', 'Mois', 'Machine', 'Gaz (kWh)', 'PE (kg)']]
+
+
+# Écriture au format des exports datés (séparateur ';'), lisible par ingestion.lire_csv
+def ecrire_exports(dossier, sites, annees, machines, graine=0):
+    os.makedirs(dossier, exist_ok=True)
+    chemins = {
+        'Global': os.path.join(dossier, f'{DERNIERE_ANNEE + 1}0101 Global_streamlit.csv'),
+        'Machine': os.path.join(dossier, f'{DERNIERE_ANNEE + 1}0101 Machine_streamlit.csv'),
+    }
+    generer_global(sites, annees, graine).to_csv(chemins['Global'], sep=';', index=False)
+    generer_machine(sites, annees, machines, graine).to_csv(chemins['Machine'], sep=';', index=False)
+    return chemins
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère des exports synthétiques Global/Machine")
+    parser.add_argument('--sites', type=int, default=5)
+    parser.add_argument('--annees', type=int, default=3)
+    parser.add_argument('--machines', type=int, default=10)
+    parser.add_argument('--graine', type=int, default=0)
+    parser.add_argument('--dossier', default='benchmarks/exports')
+    args = parser.parse_args()
+    for type_export, chemin in ecrire_exports(args.dossier, args.sites, args.annees, args.machines, args.graine).items():
+        print(f"{type_export} -> {chemin}")
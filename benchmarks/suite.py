@@ -0,0 +1,178 @@
+# Suite de benchmarks des deux pages sur des données synthétiques de taille croissante.
+# Les étapes mesurées sont les fonctions du moteur de calcul (moteur.py), sans Streamlit.
+# Chaque étape est chronométrée séparément : chargement du CSV, dérivation des colonnes de période,
+# agrégation, construction de la figure (sérialisation JSON comprise) et mise en forme du tableau,
+# ainsi que le cube construit lot par lot directement depuis le CSV et la table de faits commune aux
+# deux pages (codes entiers, voir faits.py) avec le cube qui en est tiré. Si DuckDB est installé, le
+# cube et le ratio machine sont aussi agrégés par le moteur SQL sur le magasin Parquet (requetes.py).
+# Les résultats sont écrits en JSON pour comparer deux exécutions et repérer les régressions.
+# Lancer depuis la racine du dépôt :
+#   python benchmarks/suite.py --scenarios petit moyen --sortie benchmarks/resultats.json
+#   python benchmarks/suite.py --reference benchmarks/resultats.json
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from agregats import construire_cube, extraire
+from generateur import ecrire_exports
+from graphiques import construire_figure
+from ingestion import ingerer, lire_csv
+from memoire import compacter
+from faits import construire_faits, cube_faits
+from moteur import cube_export, deriver_donnees, deriver_machines, formater_tableau, ratio_machines
+from requetes import cube_sql, duckdb_disponible, ratio_machines_sql
+
+# Scénarios : (sites, années, machines)
+SCENARIOS = {
+    'petit': (5, 3, 10),
+    'moyen': (20, 5, 50),
+    'grand': (50, 10, 150),
+    'tres_grand': (200, 15, 500),
+}
+
+PERIODES_GLOBAL = ['Année', 'Trimestre', 'Mois', 'Semaine', 'Jour']
+PERIODES_MACHINE = ['Année', 'Mois', 'Semaine']
+
+PAGE_GLOBAL = 'TableaudebordPTWEFR.py'
+PAGE_MACHINE = 'pages/Machine.py'
+
+
+def figure_json(df_grouped, periode, serie, indicateur):
+    return construire_figure(df_grouped, periode, serie, indicateur).to_json()
+
+
+# Meilleur temps (ms) sur plusieurs exécutions, et résultat de la dernière
+def chronometrer(repetitions, fonction, *args):
+    meilleur = float('inf')
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        resultat = fonction(*args)
+        meilleur = min(meilleur, time.perf_counter() - debut)
+    return meilleur * 1000, resultat
+
+
+def charger(chemin):
+    return compacter(lire_csv(chemin).to_pandas())
+
+
+def mesurer_global(chemin, repetitions):
+    mesures = []
+    ms, df2 = chronometrer(repetitions, charger, chemin)
+    mesures.append(('chargement_csv', None, ms, len(df2)))
+    ms, df2 = chronometrer(repetitions, lambda: deriver_donnees(df2.copy()))
+    mesures.append(('derivation', None, ms, len(df2)))
+    ms, cube = chronometrer(repetitions, construire_cube, df2)
+    mesures.append(('agregation', None, ms, sum(len(table) for table in cube.values())))
+    ms, cube_lots = chronometrer(repetitions, cube_export, chemin)
+    mesures.append(('cube_par_lots', None, ms, sum(len(table) for table in cube_lots.values())))
+    ms, faits = chronometrer(repetitions, construire_faits, df2, None)
+    mesures.append(('faits', None, ms, len(faits.faits)))
+    ms, cube_codes = chronometrer(repetitions, cube_faits, faits)
+    mesures.append(('cube_faits', None, ms, sum(len(table) for table in cube_codes.values())))
+    if duckdb_disponible():
+        magasin = ingerer(chemin, os.path.join(os.path.dirname(chemin), 'magasin_global'))
+        ms, cube_duckdb = chronometrer(repetitions, cube_sql, magasin)
+        mesures.append(('cube_sql', None, ms, sum(len(table) for table in cube_duckdb.values())))
+    for periode in PERIODES_GLOBAL:
+        df_grouped = extraire(cube, periode, 'Global', 'Gaz (kWh/kg)')
+        ms, figure = chronometrer(repetitions, figure_json, df_grouped, periode, 'Site', 'Gaz (kWh/kg)')
+        mesures.append(('figure', periode, ms, len(df_grouped)))
+        ms, tableau = chronometrer(repetitions, formater_tableau, df_grouped, periode, 'Gaz (kWh/kg)')
+        mesures.append(('tableau', periode, ms, len(tableau)))
+    return mesures
+
+
+def mesurer_machine(chemin, repetitions):
+    mesures = []
+    ms, df2 = chronometrer(repetitions, charger, chemin)
+    mesures.append(('chargement_csv', None, ms, len(df2)))
+    ms, df2 = chronometrer(repetitions, lambda: deriver_machines(df2.copy()))
+    mesures.append(('derivation', None, ms, len(df2)))
+    ms, faits = chronometrer(repetitions, construire_faits, None, df2)
+    mesures.append(('faits', None, ms, len(faits.faits)))
+    for periode in PERIODES_MACHINE:
+        ms, df_grouped = chronometrer(repetitions, ratio_machines, faits, periode)
+        mesures.append(('agregation', periode, ms, len(df_grouped)))
+        ms, figure = chronometrer(repetitions, figure_json, df_grouped, periode, 'Machine', 'Gaz (kWh/kg)')
+        mesures.append(('figure', periode, ms, len(df_grouped)))
+        ms, tableau = chronometrer(repetitions, formater_tableau, df_grouped, periode, 'Gaz (kWh/kg)')
+        mesures.append(('tableau', periode, ms, len(tableau)))
+    if duckdb_disponible():
+        magasin = ingerer(chemin, os.path.join(os.path.dirname(chemin), 'magasin_machine'))
+        for periode in PERIODES_MACHINE:
+            ms, df_grouped = chronometrer(repetitions, ratio_machines_sql, magasin, periode)
+            mesures.append(('agregation_sql', periode, ms, len(df_grouped)))
+    return mesures
+
+
+def executer(scenarios, repetitions):
+    resultats = []
+    for scenario in scenarios:
+        sites, annees, machines = SCENARIOS[scenario]
+        with tempfile.TemporaryDirectory() as dossier:
+            chemins = ecrire_exports(dossier, sites, annees, machines)
+            for page, mesurer, chemin in ((PAGE_GLOBAL, mesurer_global, chemins['Global']),
+                                          (PAGE_MACHINE, mesurer_machine, chemins['Machine'])):
+                for etape, periode, ms, lignes in mesurer(chemin, repetitions):
+                    resultats.append({'page': page, 'scenario': scenario, 'sites': sites, 'annees': annees,
+                                      'machines': machines, 'etape': etape, 'periode': periode,
+                                      'lignes': lignes, 'ms': round(ms, 3)})
+                    print(f"{page:<24}{scenario:<12}{etape:<16}{periode or '':<11}{lignes:>9}{ms:>12.2f} ms")
+    return resultats
+
+
+def cle(resultat):
+    return resultat['page'], resultat['scenario'], resultat['etape'], resultat['periode']
+
+
+# Étapes plus lentes que la référence au-delà de la tolérance (les mesures sous 1 ms sont ignorées)
+def regressions(resultats, reference, tolerance):
+    temps_reference = {cle(resultat): resultat['ms'] for resultat in reference}
+    lentes = []
+    for resultat in resultats:
+        avant = temps_reference.get(cle(resultat))
+        if avant is not None and resultat['ms'] > 1 and resultat['ms'] > avant * (1 + tolerance):
+            lentes.append((resultat, avant))
+    return lentes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks des pages sur des données synthétiques")
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=['petit', 'moyen', 'grand'])
+    parser.add_argument('--repetitions', type=int, default=3)
+    parser.add_argument('--sortie', default='benchmarks/resultats.json')
+    parser.add_argument('--reference', help="résultats d'une exécution précédente à comparer")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="ralentissement toléré (0.25 = +25 %%)")
+    args = parser.parse_args()
+
+    resultats = executer(args.scenarios, args.repetitions)
+    with open(args.sortie, 'w', encoding='utf-8') as f:
+        json.dump({
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'repetitions': args.repetitions,
+            'resultats': resultats,
+        }, f, ensure_ascii=False, indent=1)
+    print(f"Résultats : {args.sortie}")
+
+    if args.reference:
+        with open(args.reference, encoding='utf-8') as f:
+            lentes = regressions(resultats, json.load(f)['resultats'], args.tolerance)
+        for resultat, avant in lentes:
+            print(f"Régression : {' / '.join(str(v) for v in cle(resultat) if v)} {avant:.2f} -> {resultat['ms']:.2f} ms")
+        sys.exit(1 if lentes else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from agregats import RATIOS, SOMMES, SOMMES_MACHINE, agreger, construire_cube_par_lots
+from facteurs import CARBONE
+from historique import nom_snapshot
+from ingestion import lire_csv, lister_snapshots
+from memoire import compacter
+from moteur import deriver_machines, lots_export
+
+# Évolution des totaux d'un export à l'autre : tous les exports datés d'un type (Archive/ et data/)
+# sont lus en parallèle avec le schéma explicite de l'ingestion, et chacun est réduit dès sa lecture
+# aux totaux par site (et 'Total') et par période. Le résultat est, pour chaque période,
+# une table export × site × période.
+PERIODES_EVOLUTION = {'Global': ['Année', 'Trimestre', 'Mois'], 'Machine': ['Année', 'Mois']}
+
+# Mesures de chaque type d'export
+MESURES = {'Global': SOMMES + [CARBONE] + list(RATIOS), 'Machine': list(SOMMES_MACHINE) + ['Gaz (kWh/kg)']}
+
+
+# Totaux machine par période et par site : gaz des lignes où PE > 0 et PE des lignes où gaz > 0
+def totaux_machine(df2, periode):
+    par_site = agreger(df2, [periode, 'Site'], conditionnelles=SOMMES_MACHINE)
+    total = agreger(df2, [periode], conditionnelles=SOMMES_MACHINE)
+    total.insert(1, 'Site', 'Total')
+    totaux = pd.concat([par_site, total], ignore_index=True)
+    totaux['Gaz (kWh/kg)'] = totaux['Gaz (kWh)'] / totaux['PE (kg)']
+    return totaux
+
+
+# Réduction d'un export aux totaux par site et par période (exécuté dans un processus de calcul) ;
+# un export Global est replié lot par lot, sans charger toutes ses lignes
+def totaux_export(chemin, type_export, periodes):
+    if type_export == 'Global':
+        cube = construire_cube_par_lots(lots_export(chemin), periodes)
+    else:
+        df2 = deriver_machines(compacter(lire_csv(chemin).to_pandas()))
+        cube = {periode: totaux_machine(df2, periode) for periode in periodes}
+    return {periode: table[[periode, 'Site'] + MESURES[type_export]] for periode, table in cube.items()}
+
+
+# Tables export × site × période de tous les exports d'un type, dans l'ordre chronologique des exports.
+# Export et Site sont catégoriels (l'ordre des catégories d'Export est celui des exports).
+def charger_evolution(type_export, periodes=None, processus=None, chemins=None):
+    periodes = periodes or PERIODES_EVOLUTION[type_export]
+    chemins = lister_snapshots(type_export) if chemins is None else chemins
+    with ProcessPoolExecutor(max_workers=processus) as executeur:
+        totaux = list(executeur.map(totaux_export, chemins, [type_export] * len(chemins), [periodes] * len(chemins)))
+
+    noms = [nom_snapshot(chemin) for chemin in chemins]
+    evolution = {}
+    for periode in periodes:
+        tables = [table[periode].assign(Export=nom) for nom, table in zip(noms, totaux)]
+        table = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=['Export', periode, 'Site'] + MESURES[type_export])
+        table['Export'] = pd.Categorical(table['Export'], categories=noms, ordered=True)
+        table['Date export'] = pd.to_datetime(table['Export'].astype(str).str.slice(0, 8), format='%Y%m%d')
+        table['Site'] = table['Site'].astype('category')
+        evolution[periode] = table[['Export', 'Date export', periode, 'Site'] + MESURES[type_export]]
+    return evolution
+
+
+# Tableau croisé d'un indicateur : une ligne par export, une colonne par période
+def pivoter(table, periode, site, indicateur):
+    lignes = table[table['Site'] == site]
+    return lignes.pivot_table(index='Export', columns=periode, values=indicateur, aggfunc='sum', observed=True, dropna=False)
+
+
+# Totaux annuels d'un site vus par chaque export :
+# python evolution.py [--type Global|Machine] [--periode Année] [--site Total] [--indicateur "Gaz (kWh)"] [--sortie evolution.csv]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Évolution des totaux par site d'un export daté à l'autre")
+    parser.add_argument('--type', dest='type_export', choices=list(PERIODES_EVOLUTION), default='Global')
+    parser.add_argument('--periode', default='Année')
+    parser.add_argument('--site', default='Total')
+    parser.add_argument('--indicateur', default='Gaz (kWh)')
+    parser.add_argument('--processus', type=int)
+    parser.add_argument('--sortie', help="fichier CSV de la table export × site × période")
+    args = parser.parse_args()
+
+    debut = time.perf_counter()
+    evolution = charger_evolution(args.type_export, [args.periode], args.processus)
+    table = evolution[args.periode]
+    print(pivoter(table, args.periode, args.site, args.indicateur).round(1).to_string())
+    if args.sortie:
+        table.to_csv(args.sortie, sep=';', index=False)
+    print(f"{table['Export'].nunique()} export(s) en {time.perf_counter() - debut:.1f} s", file=sys.stderr)
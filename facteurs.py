@@ -0,0 +1,106 @@
+import hashlib
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from periodes import annee_periode
+
+# Facteurs d'émission (tCO2 par MWh) de l'empreinte carbone, lus dans deux petites tables versionnées
+# avec le code : data/facteurs_emission.csv (un jeu de facteurs par hypothèse : 'Référence', scénarios)
+# et data/sites.csv (pays de chaque site). Une règle vise un site, un pays ou tous les sites
+# (Site et Pays vides) ; elle s'applique à partir de son année (vide = toutes les années) jusqu'à
+# la règle suivante. La règle d'un site l'emporte sur celle de son pays, qui l'emporte sur la règle
+# générale.
+FICHIER_FACTEURS = os.path.join('data', 'facteurs_emission.csv')
+FICHIER_SITES = os.path.join('data', 'sites.csv')
+
+JEU_REFERENCE = 'Référence'
+CARBONE = 'Empreinte carbone (tCO2)'
+
+# Colonne de la table des facteurs de chaque mesure du cube
+FACTEURS = {'Gaz (kWh)': 'Gaz (tCO2/MWh)', 'Electricité (kWh)': 'Electricité (tCO2/MWh)'}
+
+# Tables lues, par contenu des fichiers
+_cache = {}
+
+# Règles des facteurs, pays de chaque site et version (empreinte du contenu des deux fichiers)
+Facteurs = namedtuple('Facteurs', ['regles', 'sites', 'version'])
+
+
+# Tables des facteurs, relues seulement si le contenu de l'un des fichiers a changé
+def lire_facteurs(chemin=FICHIER_FACTEURS, chemin_sites=FICHIER_SITES):
+    empreinte = hashlib.sha1()
+    for fichier in (chemin, chemin_sites):
+        with open(fichier, 'rb') as contenu:
+            empreinte.update(contenu.read())
+    cle = (chemin, chemin_sites, empreinte.hexdigest()[:12])
+    if cle not in _cache:
+        regles = pd.read_csv(chemin, sep=';', dtype={'Jeu': str, 'Site': str, 'Pays': str})
+        regles[['Site', 'Pays']] = regles[['Site', 'Pays']].fillna('')
+        regles['Année'] = regles['Année'].fillna(0).astype('int64')
+        sites = pd.read_csv(chemin_sites, sep=';', dtype=str).set_index('Site')['Pays']
+        _cache.clear()
+        _cache[cle] = Facteurs(regles, sites, cle[2])
+    return _cache[cle]
+
+
+# Jeux de facteurs disponibles, dans l'ordre de la table
+def jeux(facteurs):
+    return list(facteurs.regles['Jeu'].unique())
+
+
+# Facteurs d'un jeu pour chaque couple (Site, Année), dans l'ordre des couples : une jointure
+# asof sur l'année par niveau de règle (site, pays, général), chaque niveau ne complétant que les
+# facteurs que les niveaux plus précis n'ont pas fixés
+def resoudre(facteurs, jeu, couples):
+    regles = facteurs.regles[facteurs.regles['Jeu'] == jeu].assign(Tous='')
+    if regles.empty:
+        raise ValueError(f"Jeu de facteurs d'émission inconnu : {jeu}")
+    colonnes = list(FACTEURS.values())
+    cles = pd.DataFrame({'Site': couples['Site'].to_numpy(), 'Année': couples['Année'].to_numpy().astype('int64')})
+    cles['Pays'] = cles['Site'].map(facteurs.sites).fillna('')
+    cles['Tous'] = ''
+    cles['Ordre'] = np.arange(len(cles))
+    cles = cles.sort_values('Année', kind='stable')
+
+    resolus = pd.DataFrame(np.nan, index=np.arange(len(cles)), columns=colonnes)
+    niveaux = {'Site': regles['Site'] != '',
+               'Pays': (regles['Site'] == '') & (regles['Pays'] != ''),
+               'Tous': (regles['Site'] == '') & (regles['Pays'] == '')}
+    for niveau, retenues in niveaux.items():
+        droite = regles.loc[retenues, [niveau, 'Année'] + colonnes].sort_values('Année', kind='stable')
+        if not droite.empty:
+            trouves = pd.merge_asof(cles[['Ordre', 'Année', niveau]], droite, on='Année', by=niveau)
+            resolus = resolus.fillna(trouves.set_index('Ordre')[colonnes])
+    return resolus
+
+
+# Empreinte carbone (tCO2) des lignes d'une table du cube pour un jeu de facteurs. Une période
+# appartient à une seule année : les facteurs sont constants dans chaque ligne (période, site) et
+# s'appliquent directement à ses sommes, sans repasser sur les lignes de l'export. Les lignes
+# 'Total' sont la somme des sites.
+def carbone(table, periode, facteurs, jeu=JEU_REFERENCE):
+    sur_sites = (table['Site'] != 'Total').to_numpy()
+    couples = pd.DataFrame({'Site': table['Site'].to_numpy()[sur_sites],
+                            'Année': np.asarray(annee_periode(table[periode], periode))[sur_sites]})
+    uniques = couples.drop_duplicates(ignore_index=True)
+    resolus = resoudre(facteurs, jeu, uniques)
+    positions = pd.MultiIndex.from_frame(uniques).get_indexer(pd.MultiIndex.from_frame(couples))
+
+    par_site = np.zeros(len(couples))
+    for mesure, facteur in FACTEURS.items():
+        par_site += np.nan_to_num(table[mesure].to_numpy()[sur_sites]) / 1000 * resolus[facteur].to_numpy()[positions]
+    valeurs = np.full(len(table), np.nan)
+    valeurs[sur_sites] = par_site
+    cles = table[periode].to_numpy()
+    totaux = pd.Series(par_site).groupby(cles[sur_sites]).sum()
+    valeurs[~sur_sites] = totaux.reindex(cles[~sur_sites]).to_numpy()
+    return valeurs
+
+
+# Cube dont l'empreinte carbone est calculée avec un autre jeu de facteurs (tables copiées,
+# le cube d'origine n'est pas modifié)
+def appliquer(cube, facteurs, jeu):
+    return {periode: table.assign(**{CARBONE: carbone(table, periode, facteurs, jeu)}) for periode, table in cube.items()}
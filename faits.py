@@ -0,0 +1,161 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from agregats import PERIODES, SOMMES, agreger, assembler_cube
+
+# Magasin de faits commun aux deux pages (schéma en étoile). Les lignes de l'export Global
+# (site × jour) et de l'export Machine (site × machine × semaine d'un mois) sont rangées dans une
+# seule table de faits dont les dimensions sont des codes entiers :
+# - Site (int16) : position dans la table des sites, commune aux deux exports
+# - Machine (int16) : position dans la table des machines (0 pour les lignes de site)
+# - Calendrier (int32) : position dans la table du calendrier (un jour, ou une semaine d'un mois),
+#   qui porte les clés de période Année, Trimestre, Mois, Semaine et Jour
+# Les lignes de chaque niveau ('Site', 'Machine') sont contiguës et triées par site : un filtre de
+# sites est un découpage par positions, les autres filtres comparent des codes. Les deux pages
+# interrogent les faits par selectionner, agreger_faits et lignes. Le ratio hebdomadaire des machines
+# et ses anomalies (ratios) sont ajoutés par moteur.charger_faits, une seule fois par version.
+Faits = namedtuple('Faits', ['faits', 'sites', 'machines', 'calendrier', 'niveaux', 'version', 'ratios'], defaults=(None,))
+
+# Positions d'un niveau : lignes (debut, fin) de la table de faits, début des lignes de chaque site
+# (un élément de plus que de sites) et entrées (debut, fin) du calendrier
+Niveau = namedtuple('Niveau', ['lignes', 'sites', 'calendrier'])
+
+# Clés de période du calendrier ; une période qui n'existe pas au niveau d'un fait vaut -1 (NaT pour
+# le jour) : les lignes de machine n'ont ni jour ni trimestre
+CALENDRIER = {'Année': 'int16', 'Trimestre': 'int32', 'Mois': 'int32', 'Semaine': 'int32', 'Jour': 'datetime64[ns]'}
+
+MESURES = ['Gaz (kWh)', 'Electricité (kWh)', 'PE (kg)']
+
+# Machine des lignes de site
+AUCUNE_MACHINE = ''
+
+
+# Table des faits à partir des lignes dérivées des deux exports (voir moteur.charger_snapshot) ;
+# un export absent (None) laisse son niveau vide
+def construire_faits(df_sites, df_machines, version=None):
+    exports = {'Site': df_sites, 'Machine': df_machines}
+    exports = {niveau: df for niveau, df in exports.items() if df is not None}
+    sites = pd.Index(sorted(set().union(*(df['Site'].astype(str).unique() for df in exports.values()))))
+    machines = pd.Index([AUCUNE_MACHINE] + sorted(df_machines['Machine'].astype(str).unique()) if df_machines is not None else [AUCUNE_MACHINE])
+
+    blocs, calendriers, niveaux = [], [], {}
+    debut, debut_calendrier = 0, 0
+    for niveau, df in exports.items():
+        codes_sites = sites.get_indexer(df['Site'].astype(str)).astype('int16')
+        ordre = np.argsort(codes_sites, kind='stable')
+
+        # Une entrée du calendrier par combinaison distincte des clés de période du niveau
+        colonnes = [colonne for colonne in CALENDRIER if colonne in df.columns]
+        groupes = df[colonnes].groupby(colonnes, sort=True, dropna=False)
+        codes_calendrier = groupes.ngroup().to_numpy().astype('int32') + debut_calendrier
+        calendrier = groupes.size().index.to_frame(index=False)
+        for colonne, type_ in CALENDRIER.items():
+            calendrier[colonne] = calendrier[colonne].astype(type_) if colonne in colonnes else pd.Series(
+                pd.NaT if colonne == 'Jour' else -1, index=calendrier.index).astype(type_)
+        calendriers.append(calendrier[list(CALENDRIER)])
+
+        bloc = {
+            'Site': codes_sites[ordre],
+            'Machine': (machines.get_indexer(df['Machine'].astype(str)).astype('int16')[ordre]
+                        if niveau == 'Machine' else np.zeros(len(df), dtype='int16')),
+            'Calendrier': codes_calendrier[ordre],
+        }
+        for mesure in MESURES:
+            bloc[mesure] = (df[mesure].to_numpy(dtype='float32')[ordre] if mesure in df.columns
+                            else np.full(len(df), np.nan, dtype='float32'))
+        blocs.append(pd.DataFrame(bloc))
+
+        niveaux[niveau] = Niveau((debut, debut + len(df)),
+                                 debut + np.searchsorted(bloc['Site'], np.arange(len(sites) + 1)),
+                                 (debut_calendrier, debut_calendrier + len(calendrier)))
+        debut += len(df)
+        debut_calendrier += len(calendrier)
+
+    return Faits(pd.concat(blocs, ignore_index=True), sites, machines,
+                 pd.concat(calendriers, ignore_index=True), niveaux, version)
+
+
+# Positions des faits d'un niveau pour une sélection de sites, de machines et d'années (None = tous)
+def selectionner(faits, niveau, sites=None, machines=None, annees=None):
+    bloc = faits.niveaux[niveau]
+    if sites is None:
+        positions = np.arange(*bloc.lignes)
+    else:
+        codes = faits.sites.get_indexer(list(sites))
+        positions = np.concatenate([np.arange(bloc.sites[code], bloc.sites[code + 1]) for code in codes[codes >= 0]]
+                                   + [np.empty(0, dtype='int64')])
+    retenues = np.ones(len(positions), dtype=bool)
+    if machines is not None:
+        retenues &= np.isin(faits.faits['Machine'].to_numpy()[positions], faits.machines.get_indexer(list(machines)))
+    if annees is not None:
+        annees_retenues = faits.calendrier['Année'].isin(list(annees)).to_numpy()
+        retenues &= annees_retenues[faits.faits['Calendrier'].to_numpy()[positions]]
+    return positions[retenues]
+
+
+# Colonnes des faits aux positions données : codes de site et de machine (décodés si decoder),
+# clés de période reprises du calendrier, mesures
+def colonnes_faits(faits, positions, noms, decoder=True):
+    colonnes = {}
+    for nom in noms:
+        if nom in ('Site', 'Machine'):
+            codes = faits.faits[nom].to_numpy()[positions]
+            colonnes[nom] = pd.Categorical.from_codes(codes, categories=faits.sites if nom == 'Site' else faits.machines) if decoder else codes
+        elif nom in CALENDRIER:
+            colonnes[nom] = faits.calendrier[nom].to_numpy()[faits.faits['Calendrier'].to_numpy()[positions]]
+        else:
+            colonnes[nom] = faits.faits[nom].to_numpy()[positions]
+    return pd.DataFrame(colonnes)
+
+
+# Sommes d'une table de faits non décodée (agregats.agreger), avec les sites et machines du résultat décodés
+def _agreger_codes(faits, table, cles, sommes=(), conditionnelles=None):
+    resultat = agreger(table, cles, sommes, conditionnelles)
+    for nom in ('Site', 'Machine'):
+        if nom in cles:
+            resultat[nom] = pd.Categorical.from_codes(resultat[nom].to_numpy(), categories=faits.sites if nom == 'Site' else faits.machines)
+    return resultat
+
+
+# Agrégation des faits d'un niveau (mêmes sommes et sommes conditionnelles que agregats.agreger)
+# pour une sélection de sites, de machines et d'années : les faits sont regroupés sur les codes,
+# décodés seulement dans le résultat
+def agreger_faits(faits, niveau, cles, sommes=(), conditionnelles=None, sites=None, machines=None, annees=None):
+    positions = selectionner(faits, niveau, sites, machines, annees)
+    mesures = list(dict.fromkeys(list(sommes) + [colonne for paire in (conditionnelles or {}).values() for colonne in paire]))
+    table = colonnes_faits(faits, positions, list(cles) + mesures, decoder=False)
+    return _agreger_codes(faits, table, cles, sommes, conditionnelles)
+
+
+# Lignes décodées d'un niveau (site, machine, clés de période et mesures du niveau), pour les calculs
+# qui travaillent ligne à ligne
+def lignes(faits, niveau, sites=None, machines=None, annees=None):
+    if niveau == 'Site':
+        noms = ['Site', 'Jour', 'Année', 'Trimestre', 'Mois', 'Semaine'] + MESURES
+    else:
+        noms = ['Site', 'Machine', 'Année', 'Mois', 'Semaine', 'Gaz (kWh)', 'PE (kg)']
+    return colonnes_faits(faits, selectionner(faits, niveau, sites, machines, annees), noms)
+
+
+# Entrées du calendrier d'un niveau (pour les listes de périodes), sans lire les faits
+def calendrier_faits(faits, niveau, annees=None):
+    calendrier = faits.calendrier.iloc[slice(*faits.niveaux[niveau].calendrier)]
+    if annees is not None:
+        calendrier = calendrier[calendrier['Année'].isin(list(annees))]
+    return calendrier.reset_index(drop=True)
+
+
+# Machines d'un site, dans l'ordre de leurs premières lignes
+def machines_site(faits, site, annees=None):
+    positions = selectionner(faits, 'Machine', sites=[site], annees=annees)
+    return list(faits.machines[pd.unique(faits.faits['Machine'].to_numpy()[positions])])
+
+
+# Cube période × site de la page principale, calculé sur les faits de site des années demandées
+# (les colonnes de période sont reprises une seule fois du calendrier pour toutes les granularités)
+def cube_faits(faits, annees=None, periodes=PERIODES):
+    table = colonnes_faits(faits, selectionner(faits, 'Site', annees=annees), ['Site'] + list(periodes) + SOMMES, decoder=False)
+    return assembler_cube({periode: (_agreger_codes(faits, table, [periode, 'Site'], SOMMES), _agreger_codes(faits, table, [periode], SOMMES))
+                           for periode in periodes})
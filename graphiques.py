@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.colors import qualitative  # Palettes de couleurs (plotly.express est bien plus long à importer)
+
+from anomalies import colonne_anomalie
+from periodes import libeller
+
+# Palette de couleurs distinctes, une couleur par série (site ou machine)
+PALETTE = qualitative.Light24
+
+# Au-delà de ce nombre de points dans la figure, les barres sont remplacées par des courbes WebGL
+SEUIL_WEBGL = 2000
+
+# Nombre de points conservés par série dense après réduction côté serveur
+POINTS_PAR_SERIE = 500
+
+
+# Largest-Triangle-Three-Buckets : conserve la forme de la courbe avec un nombre fixe de points
+# (premier et dernier point, puis dans chaque tranche le point formant le plus grand triangle
+# avec le point retenu précédent et la moyenne de la tranche suivante)
+def lttb(x, y, points):
+    n = len(y)
+    if n <= points or points < 3:
+        return np.arange(n)
+    bords = np.linspace(1, n - 1, points - 1).astype(int)
+    retenus = np.empty(points, dtype=int)
+    retenus[0], retenus[-1] = 0, n - 1
+    precedent = 0
+    for i in range(points - 2):
+        debut, fin = bords[i], bords[i + 1]
+        if i + 2 < len(bords):
+            x_moyen, y_moyen = x[fin:bords[i + 2]].mean(), y[fin:bords[i + 2]].mean()
+        else:
+            x_moyen, y_moyen = x[n - 1], y[n - 1]
+        aires = np.abs((x[precedent] - x_moyen) * (y[debut:fin] - y[precedent])
+                       - (x[precedent] - x[debut:fin]) * (y_moyen - y[precedent]))
+        precedent = debut + int(np.argmax(aires))
+        retenus[i + 1] = precedent
+    return retenus
+
+
+# Minimum et maximum de chaque tranche : conserve les pics, deux points par tranche
+def minmax(x, y, points):
+    n = len(y)
+    if n <= points or points < 2:
+        return np.arange(n)
+    tranches = np.arange(n) * (points // 2) // n
+    ordre = np.lexsort((y, tranches))
+    debuts = np.searchsorted(tranches[ordre], np.arange(points // 2))
+    fins = np.append(debuts[1:], n) - 1
+    return np.unique(np.concatenate([ordre[debuts], ordre[fins]]))
+
+
+REDUCTIONS = {'lttb': lttb, 'minmax': minmax}
+
+
+# Figure d'un indicateur par période, une série par valeur de la colonne serie (site ou machine),
+# construite en une seule passe : un tri unique regroupe chaque série dans l'ordre chronologique,
+# les libellés de période sont calculés une fois pour toutes les lignes.
+# Les figures denses passent en courbes WebGL (Scattergl) réduites côté serveur (lttb ou minmax).
+# Avec evidence=True, les lignes signalées comme anomalies sont marquées par une croix rouge.
+def construire_figure(df, periode, serie, indicateur, couleur_unique=False, reduction='lttb', evidence=False):
+    codes, noms = pd.factorize(df[serie])  # séries dans l'ordre d'apparition
+    ordre = np.lexsort((df[periode].to_numpy(), codes))
+    bornes = np.searchsorted(codes[ordre], np.arange(len(noms) + 1))
+
+    if periode == 'Année':
+        x, positions = df[periode].to_numpy()[ordre], df[periode].to_numpy()[ordre]
+    else:
+        libelles = libeller(df[periode].to_numpy(), periode)
+        x, positions = np.asarray(libelles)[ordre], libelles.codes[ordre]
+    y = df[indicateur].to_numpy(dtype='float64')[ordre]
+    dense = len(df) > SEUIL_WEBGL
+
+    fig = go.Figure()
+    for idx, nom in enumerate(noms):
+        debut, fin = bornes[idx], bornes[idx + 1]
+        # Si une seule série est affichée pour un site choisi, appliquer la couleur bleue
+        color = 'Lightblue' if couleur_unique and len(noms) == 1 else PALETTE[idx % len(PALETTE)]
+        if not dense:
+            fig.add_trace(go.Bar(x=x[debut:fin], y=y[debut:fin], name=nom, marker=dict(color=color)))
+            continue
+        finis = debut + np.flatnonzero(np.isfinite(y[debut:fin]))
+        retenus = finis[REDUCTIONS[reduction](positions[finis].astype('float64'), y[finis], POINTS_PAR_SERIE)]
+        fig.add_trace(go.Scattergl(x=x[retenus], y=y[retenus], name=nom, mode='lines', line=dict(color=color)))
+    if evidence and colonne_anomalie(indicateur) in df.columns:
+        signalees = df[colonne_anomalie(indicateur)].to_numpy()[ordre] & np.isfinite(y)
+        trace = go.Scattergl if dense else go.Scatter
+        fig.add_trace(trace(x=x[signalees], y=y[signalees], name='Anomalies', mode='markers',
+                            marker=dict(color='red', symbol='x', size=10)))
+
+    if dense and periode != 'Année':
+        # Ordre chronologique de l'axe, même si les séries réduites ne gardent pas les mêmes périodes
+        fig.update_xaxes(categoryorder='array', categoryarray=list(libelles.categories))
+    return fig
+
+
+# Évolution d'un indicateur d'un export à l'autre : exports datés en abscisse (ordre chronologique),
+# une courbe par période (ex. une par année)
+def figure_evolution(df, periode, indicateur):
+    cles = np.sort(df[periode].unique())
+    libelles = cles if periode == 'Année' else np.asarray(libeller(cles, periode))
+    fig = go.Figure()
+    for idx, (cle, libelle) in enumerate(zip(cles, libelles)):
+        lignes = df[df[periode] == cle].sort_values('Export')
+        fig.add_trace(go.Scatter(x=lignes['Export'].astype(str), y=lignes[indicateur], name=str(libelle),
+                                 mode='lines+markers', line=dict(color=PALETTE[idx % len(PALETTE)])))
+    fig.update_xaxes(type='category')
+    return fig
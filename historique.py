@@ -0,0 +1,135 @@
+import json
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ingestion import (DOSSIER_MAGASIN, SCHEMAS, VERROU, ecrire_json, empreintes_lignes, lire_csv, lister_snapshots,
+                       signature_source, type_snapshot)
+
+# Historique des exports datés, adressé par contenu :
+# - lignes/   : chaque ligne distincte n'est stockée qu'une fois, identifiée par son empreinte
+# - membres/  : pour chaque export, la liste ordonnée des empreintes de ses lignes
+# - index.json: version du CSV intégrée pour chaque export
+# Les exports successifs se recouvrent presque entièrement, l'historique ne stocke donc que
+# les lignes nouvelles ou révisées de chaque export.
+DOSSIER_HISTORIQUE = os.path.join(DOSSIER_MAGASIN, 'historique')
+
+# Clés identifiant une ligne dans chaque type d'export
+CLES = {'Global': ['Site', 'Date'], 'Machine': ['Site', 'Année', 'Semaine', 'Mois', 'Machine']}
+
+
+def chemin_historique(type_export, racine=DOSSIER_HISTORIQUE):
+    return os.path.join(racine, type_export)
+
+
+def nom_snapshot(chemin):
+    return os.path.splitext(os.path.basename(chemin))[0]
+
+
+def lire_index(historique):
+    chemin = os.path.join(historique, 'index.json')
+    if not os.path.exists(chemin):
+        return {}
+    with open(chemin, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def empreintes_connues(historique):
+    dossier = os.path.join(historique, 'lignes')
+    if not os.path.isdir(dossier) or not os.listdir(dossier):
+        return pd.Series([], dtype='uint64')
+    return pq.read_table(dossier, columns=['_empreinte']).column('_empreinte').to_pandas()
+
+
+# Intégration d'un export : seules ses lignes encore inconnues de l'historique sont écrites
+def integrer_snapshot(chemin_csv, historique):
+    nom = nom_snapshot(chemin_csv)
+    source = signature_source(chemin_csv)
+    df = lire_csv(chemin_csv).to_pandas()
+    empreintes = empreintes_lignes(df)
+
+    nouvelles = df[~empreintes.isin(empreintes_connues(historique)).to_numpy()]
+    nouvelles = nouvelles.assign(_empreinte=empreintes[nouvelles.index]).drop_duplicates('_empreinte')
+    if len(nouvelles):
+        os.makedirs(os.path.join(historique, 'lignes'), exist_ok=True)
+        pq.write_table(pa.Table.from_pandas(nouvelles, preserve_index=False),
+                       os.path.join(historique, 'lignes', f"{nom}-{source['mtime_ns']}.parquet"))
+
+    os.makedirs(os.path.join(historique, 'membres'), exist_ok=True)
+    pq.write_table(pa.table({'_empreinte': empreintes.to_numpy()}), os.path.join(historique, 'membres', f"{nom}.parquet"))
+
+    # Index remplacé d'un bloc (fichier temporaire renommé) : il n'est jamais lu tronqué
+    index = lire_index(historique)
+    index[nom] = source
+    ecrire_json(os.path.join(historique, 'index.json'), index)
+    return len(nouvelles)
+
+
+# Intégration des exports datés d'un type qui ne sont pas encore (ou plus) à jour dans l'historique
+def mettre_a_jour_historique(type_export, racine=DOSSIER_HISTORIQUE):
+    historique = chemin_historique(type_export, racine)
+    with VERROU:
+        index = lire_index(historique)
+        for chemin in lister_snapshots(type_export):
+            if index.get(nom_snapshot(chemin)) != signature_source(chemin):
+                integrer_snapshot(chemin, historique)
+    return historique
+
+
+# Toutes les lignes distinctes de l'historique, indexées par empreinte (lues une seule fois,
+# puis chaque export est reconstitué sans relire de CSV)
+def charger_lignes(historique):
+    lignes = pq.read_table(os.path.join(historique, 'lignes')).to_pandas()
+    return lignes.drop_duplicates('_empreinte').set_index('_empreinte')
+
+
+def lister_historique(historique):
+    return sorted(lire_index(historique))
+
+
+# Contenu d'un export tel qu'il a été livré, dans l'ordre de ses lignes
+def reconstituer(lignes, historique, nom):
+    membres = pq.read_table(os.path.join(historique, 'membres', f"{nom}.parquet")).column('_empreinte').to_numpy()
+    schema = SCHEMAS[type_snapshot(f"{nom}.csv")]
+    return lignes.loc[membres, schema.names].reset_index(drop=True)
+
+
+# Différences entre deux exports : une ligne par valeur ajoutée, supprimée ou révisée.
+# Les lignes identiques dans les deux exports sont écartées par leur empreinte avant toute jointure.
+def comparer(avant, apres, type_export):
+    cles = CLES[type_export]
+    mesures = [champ.name for champ in SCHEMAS[type_export] if pa.types.is_floating(champ.type)]
+    empreintes_avant, empreintes_apres = empreintes_lignes(avant), empreintes_lignes(apres)
+    avant = avant[~empreintes_avant.isin(empreintes_apres).to_numpy()]
+    apres = apres[~empreintes_apres.isin(empreintes_avant).to_numpy()]
+
+    fusion = avant[cles + mesures].merge(apres[cles + mesures], on=cles, how='outer', suffixes=(' avant', ' après'), indicator=True)
+    changement = fusion['_merge'].map({'left_only': 'supprimée', 'right_only': 'ajoutée', 'both': 'révisée'}).astype(str)
+
+    revisions = []
+    for mesure in mesures:
+        valeur_avant, valeur_apres = fusion[f'{mesure} avant'], fusion[f'{mesure} après']
+        differente = ~((valeur_avant == valeur_apres) | (valeur_avant.isna() & valeur_apres.isna()))
+        revisions.append(pd.DataFrame({
+            **{cle: fusion.loc[differente, cle] for cle in cles},
+            'Changement': changement[differente],
+            'Indicateur': mesure,
+            'Avant': valeur_avant[differente],
+            'Après': valeur_apres[differente],
+            'Écart': (valeur_apres - valeur_avant)[differente],
+        }))
+    return pd.concat(revisions, ignore_index=True).sort_values(cles + ['Indicateur'], ignore_index=True)
+
+
+# Révisions entre deux exports : python historique.py "20250301 Global_streamlit" "20250601 Global_streamlit"
+if __name__ == "__main__":
+    avant_nom, apres_nom = sys.argv[1:3]
+    type_export = type_snapshot(f"{apres_nom}.csv")
+    historique = mettre_a_jour_historique(type_export)
+    lignes = charger_lignes(historique)
+    revisions = comparer(reconstituer(lignes, historique, avant_nom), reconstituer(lignes, historique, apres_nom), type_export)
+    print(revisions.groupby(['Changement', 'Indicateur']).size().to_string())
+    print(revisions.to_string(max_rows=50))
@@ -0,0 +1,441 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+from collections import namedtuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from memoire import compacter
+
+# Dossiers où sont déposés les exports datés
+DOSSIERS_SNAPSHOTS = ("data", "Archive")
+
+# Dossier du magasin colonnaire (un sous-dossier Parquet par export)
+DOSSIER_MAGASIN = os.path.join("data", "store")
+
+# Exports datés : "20260529 Global_streamlit2.csv", "20260101 Machine_streamlit.csv", ...
+MOTIF_SNAPSHOT = re.compile(r"^(\d{8}) (Global|Machine)_streamlit(\d*)\.csv$")
+
+# Schéma explicite de chaque type d'export (les ratios kWh/kg précalculés ne sont pas conservés,
+# les pages les recalculent à partir des sommes)
+SCHEMAS = {
+    'Global': pa.schema([
+        ('Site', pa.string()),
+        ('Date', pa.timestamp('ns')),
+        ('Gaz (kWh)', pa.float64()),
+        ('PE (kg)', pa.float64()),
+        ('Electricité (kWh)', pa.float64()),
+        ('Semaine', pa.int32()),
+        ('Année', pa.int32()),
+        ('Mois', pa.int32()),
+        ('Jour', pa.timestamp('ns')),
+    ]),
+    'Machine': pa.schema([
+        ('Site', pa.string()),
+        ('Année', pa.int32()),
+        ('Semaine', pa.int32()),
+        ('Mois', pa.int32()),
+        ('Machine', pa.string()),
+        ('Gaz (kWh)', pa.float64()),
+        ('PE (kg)', pa.float64()),
+    ]),
+}
+
+# Machine de l'export Machine qui est un doublon de saisie (écartée de tous les calculs)
+MACHINE_DOUBLON = 'F4B,'
+
+# Partitionnement Hive par site puis par année : Site=PTWE35/Année=2024/part-0.parquet
+PARTITIONNEMENT = ds.partitioning(pa.schema([('Site', pa.string()), ('Année', pa.int32())]), flavor='hive')
+
+# Nombre de lignes par lot lu dans un export ou dans un magasin : la mémoire d'une lecture
+# par lots ne dépend pas de la taille des données
+LIGNES_PAR_LOT = 2 ** 17
+
+# Types de lecture des colonnes des CSV, ceux des schémas (les dates sont lues en texte puis
+# converties, les dates invalides donnant NaT)
+TYPES_CSV = {'Site': object, 'Machine': object, 'Date': object, 'Jour': object,
+             'Gaz (kWh)': 'float64', 'PE (kg)': 'float64', 'Electricité (kWh)': 'float64',
+             'Semaine': 'int32', 'Année': 'int32', 'Mois': 'int32'}
+
+# Fichier témoin écrit dans chaque magasin, il décrit la version du CSV d'origine
+FICHIER_SOURCE = "_source.json"
+
+# Une seule ingestion à la fois dans le processus (les sessions Streamlit partagent les magasins) ;
+# entre processus, chaque écriture prépare sa propre copie du magasin et la met en place d'un bloc
+VERROU = threading.Lock()
+
+
+# Liste des exports d'un type donné, du plus ancien au plus récent
+# (à date égale, "Global_streamlit2" passe après "Global_streamlit")
+def lister_snapshots(type_snapshot, dossiers=DOSSIERS_SNAPSHOTS):
+    snapshots = []
+    for dossier in dossiers:
+        if not os.path.isdir(dossier):
+            continue
+        for nom in os.listdir(dossier):
+            correspondance = MOTIF_SNAPSHOT.match(nom)
+            if correspondance and correspondance.group(2) == type_snapshot:
+                cle = (correspondance.group(1), int(correspondance.group(3) or 0))
+                snapshots.append((cle, os.path.join(dossier, nom)))
+    return [chemin for cle, chemin in sorted(snapshots)]
+
+
+# Export le plus récent d'après la date en préfixe du nom de fichier
+def dernier_snapshot(type_snapshot, dossiers=DOSSIERS_SNAPSHOTS):
+    snapshots = lister_snapshots(type_snapshot, dossiers)
+    if not snapshots:
+        raise FileNotFoundError(f"Aucun export {type_snapshot}_streamlit trouvé dans {', '.join(dossiers)}")
+    return snapshots[-1]
+
+
+def type_snapshot(chemin):
+    correspondance = MOTIF_SNAPSHOT.match(os.path.basename(chemin))
+    if not correspondance:
+        raise ValueError(f"Nom d'export non reconnu : {chemin}")
+    return correspondance.group(2)
+
+
+# Lecture d'un export par lots de lignes : seules les colonnes du schéma sont décodées (les ratios
+# kWh/kg précalculés sont ignorés), avec des types explicites, et chaque lot est converti au schéma
+# de son type d'export
+def lire_csv_par_lots(chemin, lignes_par_lot=LIGNES_PAR_LOT):
+    type_export = type_snapshot(chemin)
+    schema = SCHEMAS[type_export]
+    with pd.read_csv(chemin, sep=";", usecols=lambda nom: nom in schema.names, dtype=TYPES_CSV,
+                     chunksize=lignes_par_lot) as lecteur:
+        for lot in lecteur:
+            yield normaliser(lot, type_export)
+
+
+def lire_csv(chemin):
+    lots = list(lire_csv_par_lots(chemin))
+    return pa.concat_tables(lots) if lots else SCHEMAS[type_snapshot(chemin)].empty_table()
+
+
+# Conversion d'un bloc d'export au schéma de son type
+def normaliser(df, type_export):
+    if type_export == 'Global':
+        df['Date'] = pd.to_datetime(df['Date'], errors='coerce', dayfirst=False)
+        # Les anciens exports n'ont pas les colonnes calendaires : on les reconstruit à partir de la date
+        if 'Année' not in df.columns:
+            df['Année'] = df['Date'].dt.year
+        if 'Mois' not in df.columns:
+            df['Mois'] = df['Date'].dt.month
+        if 'Semaine' not in df.columns:
+            df['Semaine'] = df['Date'].dt.isocalendar().week.astype('int64')
+        if 'Jour' in df.columns:
+            df['Jour'] = pd.to_datetime(df['Jour'], errors='coerce', dayfirst=False)
+        else:
+            df['Jour'] = df['Date']
+    schema = SCHEMAS[type_export]
+    return pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+
+# Signature d'un fichier (chemin, date de modification, taille) : sert de clé aux caches des pages,
+# un nouvel export déposé dans data/ les invalide donc automatiquement
+def signature_fichier(chemin):
+    stat = os.stat(chemin)
+    return chemin, stat.st_mtime_ns, stat.st_size
+
+
+# Signature enregistrée dans le manifeste d'un magasin et dans l'index de l'historique
+def signature_source(chemin):
+    chemin, mtime_ns, taille = signature_fichier(chemin)
+    return {'csv': os.path.basename(chemin), 'mtime_ns': mtime_ns, 'taille': taille}
+
+
+# Magasin propre à un export daté : data/store/20260529 Global_streamlit2
+def chemin_magasin(chemin_csv, racine=DOSSIER_MAGASIN):
+    return os.path.join(racine, os.path.splitext(os.path.basename(chemin_csv))[0])
+
+
+# Magasin courant d'un type d'export (data/store/Global), mis à jour de façon incrémentale
+# à chaque nouvel export
+def magasin_courant(type_export, racine=DOSSIER_MAGASIN):
+    return os.path.join(racine, type_export)
+
+
+# Manifeste d'un magasin : version du CSV intégré et empreinte de chaque partition
+def lire_manifeste(magasin):
+    temoin = os.path.join(magasin, FICHIER_SOURCE)
+    if not os.path.exists(temoin):
+        return None
+    with open(temoin, encoding='utf-8') as f:
+        manifeste = json.load(f)
+    # Les magasins écrits avant les empreintes de partitions sont réécrits entièrement
+    return manifeste if 'partitions' in manifeste else None
+
+
+def ecrire_manifeste(magasin, chemin_csv, empreintes):
+    manifeste = {
+        'source': signature_source(chemin_csv),
+        'partitions': [[site, annee, empreinte] for (site, annee), empreinte in sorted(empreintes.items())],
+    }
+    # Le fichier d'origine (éventuellement partagé par lien avec une copie du magasin) n'est jamais
+    # modifié sur place
+    ecrire_json(os.path.join(magasin, FICHIER_SOURCE), manifeste)
+
+
+# Écriture d'un fichier JSON dans un fichier temporaire au nom unique, renommé à la fin : un lecteur
+# concurrent ou un arrêt brutal ne voient jamais un fichier tronqué
+def ecrire_json(chemin, contenu):
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(chemin),
+                                     prefix=os.path.basename(chemin) + '.', suffix='.tmp', delete=False) as f:
+        temporaire = f.name
+        json.dump(contenu, f, ensure_ascii=False)
+    os.replace(temporaire, chemin)
+
+
+# Empreinte du contenu d'un magasin (combinaison des empreintes de ses partitions) : identique
+# tant que les données ne changent pas, même si l'export est redéposé
+def empreinte_magasin(magasin):
+    partitions = json.dumps(lire_manifeste(magasin)['partitions'], ensure_ascii=False)
+    return hashlib.sha1(partitions.encode('utf-8')).hexdigest()[:16]
+
+
+# Le magasin est à jour si son manifeste correspond au CSV actuel
+def magasin_a_jour(chemin_csv, magasin):
+    manifeste = lire_manifeste(magasin)
+    return manifeste is not None and manifeste['source'] == signature_source(chemin_csv)
+
+
+# Empreinte de chaque ligne (hachage vectorisé de toutes les colonnes)
+def empreintes_lignes(df):
+    return pd.util.hash_pandas_object(df, index=False)
+
+
+# Empreinte de chaque partition (site, année) : nombre de lignes et somme des empreintes
+# de ses lignes. Deux exports qui ont les mêmes lignes dans une partition ont la même empreinte.
+def empreintes_partitions(df):
+    return formater_empreintes(cumuler_empreintes({}, df))
+
+
+# Ajout des lignes d'un lot aux empreintes cumulées {(site, année): (nombre, somme modulo 2^64)}
+def cumuler_empreintes(cumul, df):
+    groupes = empreintes_lignes(df).groupby([df['Site'], df['Année']])
+    nombres, sommes = groupes.size(), groupes.sum()
+    for (site, annee), nombre, somme in zip(nombres.index, nombres, sommes):
+        avant_nombre, avant_somme = cumul.get((site, int(annee)), (0, 0))
+        cumul[(site, int(annee))] = (avant_nombre + int(nombre), (avant_somme + int(somme)) % 2 ** 64)
+    return cumul
+
+
+def formater_empreintes(cumul):
+    return {cle: f"{nombre}:{somme:016x}" for cle, (nombre, somme) in cumul.items()}
+
+
+def masque_partitions(df, partitions):
+    return pd.MultiIndex.from_arrays([df['Site'], df['Année']]).isin(partitions)
+
+
+# Lignes des partitions touchées d'un magasin
+def lire_partitions(magasin, partitions, colonnes=None, compact=False):
+    sites = sorted({site for site, annee in partitions})
+    annees = sorted({annee for site, annee in partitions})
+    df = lire_magasin(magasin, sites=sites, annees=annees, colonnes=colonnes, compact=compact)
+    return df[masque_partitions(df, partitions)]
+
+
+# Lignes du nouvel export (lots écrits pendant la lecture) absentes du magasin (nouvelles ou
+# modifiées), parmi les partitions touchées
+def lignes_modifiees(lots, magasin, partitions):
+    candidates = lire_partitions(lots, partitions)
+    stockees = lire_partitions(magasin, partitions)
+    return candidates[~empreintes_lignes(candidates).isin(empreintes_lignes(stockees)).to_numpy()]
+
+
+# Dossier temporaire propre au processus, à côté du magasin
+def dossier_temporaire(magasin, nature='tmp'):
+    temporaire = f"{magasin}.{nature}-{os.getpid()}"
+    shutil.rmtree(temporaire, ignore_errors=True)
+    return temporaire
+
+
+# Écriture de lots Arrow dans un dossier partitionné par site et année, au fil de la lecture
+def ecrire_lots(lots, schema, dossier):
+    ds.write_dataset(
+        (batch for lot in lots for batch in lot.to_batches()), dossier, schema=schema, format='parquet',
+        partitioning=PARTITIONNEMENT, existing_data_behavior='overwrite_or_ignore', use_threads=False,
+    )
+
+
+def cle_partition(fragment):
+    cles = ds.get_partition_keys(fragment.partition_expression)
+    return cles['Site'], cles['Année']
+
+
+# Mise en place d'un magasin préparé dans un dossier temporaire : deux renommages, l'ancien magasin
+# n'est supprimé qu'une fois le nouveau en place (un magasin n'est jamais lu à moitié écrit)
+def remplacer_magasin(temporaire, magasin):
+    ancien = f"{magasin}.old-{os.getpid()}"
+    shutil.rmtree(ancien, ignore_errors=True)
+    if os.path.exists(magasin):
+        os.replace(magasin, ancien)
+    os.replace(temporaire, magasin)
+    shutil.rmtree(ancien, ignore_errors=True)
+
+
+# Suppression des dossiers de partition restés vides
+def supprimer_dossiers_vides(racine):
+    for dossier, sous_dossiers, fichiers in os.walk(racine, topdown=False):
+        if dossier != racine and not os.listdir(dossier):
+            os.rmdir(dossier)
+
+
+# Écriture complète dans un dossier temporaire renommé à la fin, pour qu'une session
+# concurrente ne lise jamais un magasin à moitié écrit. Les lots sont écrits au fil de la lecture,
+# les empreintes (cumulées pendant la lecture) sont écrites une fois tous les lots consommés.
+def ecrire_complet(lots, schema, magasin, chemin_csv, empreintes):
+    temporaire = dossier_temporaire(magasin)
+    ecrire_lots(lots, schema, temporaire)
+    ecrire_manifeste(temporaire, chemin_csv, formater_empreintes(empreintes))
+    remplacer_magasin(temporaire, magasin)
+
+
+# Remplacement des seules partitions modifiées dans une copie du magasin (fichiers inchangés liés, pas
+# recopiés) par les fichiers des mêmes partitions écrits pendant la lecture de l'export (lots), mise
+# en place avec son manifeste ; les partitions disparues de l'export sont supprimées avec leurs dossiers
+def ecrire_partitions(lots, magasin, partitions, chemin_csv, empreintes):
+    temporaire = dossier_temporaire(magasin)
+    shutil.copytree(magasin, temporaire, copy_function=os.link)
+    touchees = set(partitions)
+    for fragment in ouvrir_magasin(temporaire).get_fragments():
+        if cle_partition(fragment) in touchees:
+            os.remove(fragment.path)
+    for fragment in ouvrir_magasin(lots).get_fragments():
+        if cle_partition(fragment) in touchees:
+            destination = os.path.join(temporaire, os.path.relpath(fragment.path, lots))
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(fragment.path, destination)
+    supprimer_dossiers_vides(temporaire)
+    ecrire_manifeste(temporaire, chemin_csv, empreintes)
+    remplacer_magasin(temporaire, magasin)
+
+
+# Résultat d'une ingestion : partitions (site, année) réécrites et lignes nouvelles ou modifiées
+# (seulement si elles sont demandées)
+Increment = namedtuple('Increment', ['partitions', 'lignes'])
+
+
+# Lots d'un export dont les empreintes de partitions sont cumulées dans empreintes au fil de la lecture
+def lots_empreintes(chemin_csv, empreintes):
+    for lot in lire_csv_par_lots(chemin_csv):
+        cumuler_empreintes(empreintes, lot.to_pandas())
+        yield lot
+
+
+# Ingestion incrémentale d'un export dans un magasin : les empreintes de partitions du manifeste
+# désignent les partitions (site, année) qui ont changé, et seules celles-ci sont réécrites.
+# Un export qui ajoute quelques jours ne touche donc que les partitions de l'année en cours.
+# L'export est lu une seule fois, par blocs écrits au fil de la lecture : directement dans le magasin
+# pour une première écriture (lignes = None, toutes nouvelles), sinon dans un dossier temporaire
+# partitionné dont seules les partitions modifiées remplacent celles du magasin. Les lignes nouvelles
+# ou modifiées ne sont comparées aux anciennes partitions que si comparer_lignes.
+def ingerer_increment(chemin_csv, magasin=None, forcer=False, comparer_lignes=False):
+    magasin = magasin or chemin_magasin(chemin_csv)
+    with VERROU:
+        manifeste = None if forcer else lire_manifeste(magasin)
+        if manifeste is not None and manifeste['source'] == signature_source(chemin_csv):
+            return Increment([], None)
+
+        cumul = {}
+        schema = SCHEMAS[type_snapshot(chemin_csv)]
+        if manifeste is None:
+            ecrire_complet(lots_empreintes(chemin_csv, cumul), schema, magasin, chemin_csv, cumul)
+            return Increment(sorted(cumul), None)
+
+        lots = dossier_temporaire(magasin, 'lots')
+        try:
+            ecrire_lots(lots_empreintes(chemin_csv, cumul), schema, lots)
+            empreintes = formater_empreintes(cumul)
+            anciennes = {(site, annee): empreinte for site, annee, empreinte in manifeste['partitions']}
+            partitions = sorted(cle for cle in empreintes.keys() | anciennes.keys() if empreintes.get(cle) != anciennes.get(cle))
+            lignes = None
+            if partitions:
+                if comparer_lignes:
+                    lignes = lignes_modifiees(lots, magasin, partitions)
+                ecrire_partitions(lots, magasin, partitions, chemin_csv, empreintes)
+            else:
+                ecrire_manifeste(magasin, chemin_csv, empreintes)
+        finally:
+            shutil.rmtree(lots, ignore_errors=True)
+        return Increment(partitions, lignes)
+
+
+# Conversion d'un export CSV en magasin Parquet partitionné par site et année
+# (par défaut son propre magasin daté, sinon le magasin indiqué, mis à jour de façon incrémentale)
+def ingerer(chemin_csv, magasin=None, forcer=False):
+    magasin = magasin or chemin_magasin(chemin_csv)
+    ingerer_increment(chemin_csv, magasin, forcer)
+    return magasin
+
+
+def ouvrir_magasin(magasin):
+    return ds.dataset(magasin, format='parquet', partitioning=PARTITIONNEMENT)
+
+
+# Sites présents dans un magasin, lus dans les noms de partitions sans ouvrir les fichiers
+def lister_sites(magasin):
+    sites = set()
+    for fragment in ouvrir_magasin(magasin).get_fragments():
+        sites.add(ds.get_partition_keys(fragment.partition_expression)['Site'])
+    return sorted(sites)
+
+
+# Filtre des partitions des sites et années demandés, et colonnes lues (par défaut toutes,
+# dans l'ordre de l'export d'origine)
+def selection_magasin(dataset, sites, annees, colonnes):
+    filtre = None
+    if sites is not None:
+        filtre = ds.field('Site').isin(list(sites))
+    if annees is not None:
+        filtre_annees = ds.field('Année').isin(list(annees))
+        filtre = filtre_annees if filtre is None else filtre & filtre_annees
+    if colonnes is None:
+        noms = set(dataset.schema.names)
+        colonnes = next(schema.names for schema in SCHEMAS.values() if set(schema.names) == noms)
+    return filtre, colonnes
+
+
+# Lecture d'un magasin : seules les partitions des sites et années demandés sont ouvertes,
+# et seules les colonnes demandées sont décodées (avec les types compacts de memoire.py si compact)
+def lire_magasin(magasin, sites=None, annees=None, colonnes=None, compact=False):
+    dataset = ouvrir_magasin(magasin)
+    filtre, colonnes = selection_magasin(dataset, sites, annees, colonnes)
+    df = dataset.to_table(columns=colonnes, filter=filtre).to_pandas()
+    return compacter(df) if compact else df
+
+
+# Lecture d'un magasin par lots de lignes (mêmes filtres et colonnes que lire_magasin), pour les
+# traitements dont la mémoire ne doit pas dépendre de la taille du magasin
+def lire_magasin_par_lots(magasin, sites=None, annees=None, colonnes=None, compact=False, lignes_par_lot=LIGNES_PAR_LOT):
+    dataset = ouvrir_magasin(magasin)
+    filtre, colonnes = selection_magasin(dataset, sites, annees, colonnes)
+    for lot in dataset.to_batches(columns=colonnes, filter=filtre, batch_size=lignes_par_lot):
+        if lot.num_rows:
+            df = lot.to_pandas()
+            yield compacter(df) if compact else df
+
+
+# Ingestion de tous les exports datés, puis mise à jour incrémentale des magasins courants
+# avec le dernier export de chaque type : python ingestion.py [--forcer]
+if __name__ == "__main__":
+    forcer = '--forcer' in sys.argv[1:]
+    for type_export in SCHEMAS:
+        for chemin in lister_snapshots(type_export):
+            magasin = ingerer(chemin, forcer=forcer)
+            print(f"{chemin} -> {magasin}")
+        chemin = dernier_snapshot(type_export)
+        increment = ingerer_increment(chemin, magasin_courant(type_export), forcer=forcer, comparer_lignes=True)
+        if increment.lignes is None:
+            lignes = "toutes les lignes" if increment.partitions else "aucune ligne"
+        else:
+            lignes = f"{len(increment.lignes)} ligne(s) nouvelle(s) ou modifiée(s)"
+        print(f"{chemin} -> {magasin_courant(type_export)} : {len(increment.partitions)} partition(s) réécrite(s), {lignes}")
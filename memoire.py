@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+# Types en mémoire des colonnes lues dans le magasin :
+# - sites et machines en catégories (quelques dizaines de valeurs distinctes)
+# - composantes de date en petits entiers (les clés AAAAMM / AAAASS sont recalculées en int32)
+# - mesures en float32 : les relevés ont au plus 7 chiffres significatifs, l'écart relatif
+#   reste inférieur à 1e-7 et les sommes sont faites en float64 (voir agregats.agreger)
+TYPES_COMPACTS = {
+    'Site': 'category',
+    'Machine': 'category',
+    'Année': 'int16',
+    'Mois': 'int8',
+    'Semaine': 'int8',
+    'Gaz (kWh)': 'float32',
+    'PE (kg)': 'float32',
+    'Electricité (kWh)': 'float32',
+}
+
+
+def compacter(df):
+    return df.astype({colonne: type_ for colonne, type_ in TYPES_COMPACTS.items() if colonne in df.columns})
+
+
+# Même DataFrame avec les types par défaut de pandas (texte en object, int64, float64),
+# tel qu'il était chargé avant les types compacts
+def types_par_defaut(df):
+    types = {}
+    for colonne, type_ in df.dtypes.items():
+        if isinstance(type_, pd.CategoricalDtype):
+            types[colonne] = object
+        elif pd.api.types.is_integer_dtype(type_):
+            types[colonne] = 'int64'
+        elif pd.api.types.is_float_dtype(type_):
+            types[colonne] = 'float64'
+    return df.astype(types)
+
+
+# Occupation mémoire par colonne avant / après les types compacts
+def rapport_memoire(df):
+    brut = types_par_defaut(df)
+    rapport = pd.DataFrame({
+        'Type avant': brut.dtypes.astype(str),
+        'Octets avant': brut.memory_usage(index=False, deep=True),
+        'Type après': df.dtypes.astype(str),
+        'Octets après': df.memory_usage(index=False, deep=True),
+    })
+    rapport.loc['Total'] = ['', rapport['Octets avant'].sum(), '', rapport['Octets après'].sum()]
+    rapport['Gain (%)'] = np.round(100 * (1 - rapport['Octets après'] / rapport['Octets avant']), 1)
+    return rapport.rename_axis('Colonne').reset_index()
@@ -0,0 +1,204 @@
+import threading
+
+import numpy as np
+
+from agregats import SOMMES_MACHINE, construire_cube_par_lots, extraire, extraire_jours, indexer_jours
+from anomalies import colonne_anomalie, filtrer_anomalies, marquer
+from faits import agreger_faits, construire_faits, lignes
+from ingestion import MACHINE_DOUBLON, dernier_snapshot, empreinte_magasin, ingerer, lire_csv_par_lots, lire_magasin, lire_magasin_par_lots, lire_manifeste, magasin_courant
+from memoire import compacter
+from periodes import libeller
+from prediction import PREDICTION, predire
+
+# Moteur de calcul des deux pages, sans Streamlit : chargement, calendrier, vues filtrées et
+# mise en forme du tableau sont des fonctions pures, mises en cache par les pages étape par étape
+# et réutilisables par les benchmarks et les traitements par lots.
+
+# Indicateurs de la page principale
+INDICATEURS = ['Gaz (kWh/kg)', 'Electricité (kWh/kg)', 'Empreinte carbone (tCO2)', 'Gaz (kWh)', 'Electricité (kWh)', 'PE (kg)']
+
+# Machines suivies par la page Machine pour le ratio gaz / PE
+MACHINES_SUIVIES = ['M2', 'R2', 'F4B', 'Rock6']
+
+
+# Colonnes de période (clés numériques et libellés des listes de sélection).
+# L'année est lue en int16 : les clés AAAAT / AAAAMM / AAAASS sont calculées en int32.
+def deriver_periodes(df2, trimestres=True):
+    annee = df2['Année'].astype('int32')
+    if trimestres:
+        df2['Trimestre'] = annee * 10 + ((df2['Mois'] - 1) // 3 + 1)
+    df2['Mois'] = annee * 100 + df2['Mois']
+    df2['Semaine'] = annee * 100 + df2['Semaine']
+    df2['Semaine_Formate'] = libeller(df2['Semaine'], 'Semaine', 'selection')
+    if trimestres:
+        df2['Trimestre_Formate'] = libeller(df2['Trimestre'], 'Trimestre', 'selection')
+    df2['Mois_Formate'] = libeller(df2['Mois'], 'Mois', 'selection')
+    return df2
+
+
+# Calcul des colonnes dérivées de l'export Global
+def deriver_donnees(df2):
+    df2 = deriver_periodes(df2)
+    df2['Mois-Abrege'] = libeller(df2['Mois'], 'Mois', 'abrege')  # Mois abrégés (ex: Jan, Feb, Mar, etc.)
+    return df2
+
+
+# Calcul des colonnes dérivées de l'export Machine (sans la machine en doublon de saisie)
+def deriver_machines(df2):
+    df2 = df2[df2['Machine'] != MACHINE_DOUBLON].copy()
+    df2 = deriver_periodes(df2, trimestres=False)
+    df2['Mois-Abrege'] = libeller(df2['Mois'], 'Mois', 'abrege')
+    return df2
+
+
+# Lecture des partitions utiles d'un magasin (types compacts) et calcul des colonnes dérivées
+def charger_snapshot(magasin, type_export, annees, sites=None):
+    df2 = lire_magasin(magasin, sites=sites, annees=annees, compact=True)
+    return deriver_donnees(df2) if type_export == 'Global' else deriver_machines(df2)
+
+
+# Mêmes données que charger_snapshot, lot par lot (la mémoire ne dépend pas de la taille du magasin)
+def charger_par_lots(magasin, type_export, annees, sites=None):
+    for df2 in lire_magasin_par_lots(magasin, sites=sites, annees=annees, compact=True):
+        yield deriver_donnees(df2) if type_export == 'Global' else deriver_machines(df2)
+
+
+# Magasin courant d'un type d'export, intégré depuis le dernier export s'il n'a encore jamais été écrit
+# (chaque page tient ensuite à jour le magasin de son propre export)
+def magasin_initialise(type_export):
+    magasin = magasin_courant(type_export)
+    if lire_manifeste(magasin) is None:
+        ingerer(dernier_snapshot(type_export), magasin)
+    return magasin
+
+
+# Faits des deux pages (voir faits.py), partagés par tout le processus : une seule copie en mémoire,
+# reconstruite seulement quand le contenu de l'un des deux magasins change, avec le ratio
+# hebdomadaire des machines et ses anomalies (scores compris), détectées une fois par version
+_faits = {}
+_verrou_faits = threading.Lock()
+
+
+def charger_faits(magasin_sites, magasin_machines):
+    version = (magasin_sites, empreinte_magasin(magasin_sites), magasin_machines, empreinte_magasin(magasin_machines))
+    with _verrou_faits:
+        if version not in _faits:
+            faits = construire_faits(charger_snapshot(magasin_sites, 'Global', None),
+                                     charger_snapshot(magasin_machines, 'Machine', None), version)
+            _faits.clear()
+            _faits[version] = faits._replace(ratios=ratios_semaines(faits))
+        return _faits[version]
+
+
+# Lots de lignes dérivées lus directement dans un export Global (types compacts)
+def lots_export(chemin, annees=None):
+    for lot in lire_csv_par_lots(chemin):
+        df2 = compacter(lot.to_pandas())
+        if annees is not None:
+            df2 = df2[df2['Année'].isin(annees)].copy()
+        yield deriver_donnees(df2)
+
+
+# Cube période × site d'un export Global replié lot par lot, sans passer par le magasin
+def cube_export(chemin, annees=None):
+    return construire_cube_par_lots(lots_export(chemin, annees))
+
+
+# Lignes dont la période est dans la plage (debut, fin), bornes comprises
+def filtrer_plage(df, periode, plage):
+    debut, fin = plage
+    return df[(df[periode] >= debut) & (df[periode] <= fin)]
+
+
+# Vue de la page principale : tranche du cube pour un site, un indicateur, une période et une plage
+# ('Global' = tous les sites côte à côte, 'Total' = somme des sites). Les jours sont découpés
+# par recherche dichotomique dans l'index journalier.
+def agreger_sites(cube, site, indicateur, periode, plage, index_jours=None):
+    if periode == 'Jour':
+        if index_jours is None:
+            index_jours = indexer_jours(cube['Jour'])
+        return extraire_jours(index_jours, site, indicateur, *plage)
+    return filtrer_plage(extraire(cube, periode, site, indicateur), periode, plage)
+
+
+# Ratio gaz / PE par période, machine et site des machines suivies, calculé en une seule passe sur
+# les faits de machine : gaz des lignes où PE > 0 et PE des lignes où gaz > 0
+def ratio_machines(faits, periode, annees=None):
+    df_merged = agreger_faits(faits, 'Machine', [periode, 'Machine', 'Site'], conditionnelles=SOMMES_MACHINE,
+                              machines=MACHINES_SUIVIES, annees=annees)
+    df_merged['Gaz (kWh/kg)'] = df_merged['Gaz (kWh)'] / df_merged['PE (kg)']
+    return df_merged[[periode, 'Site', 'Machine', 'Gaz (kWh/kg)']]
+
+
+# Ratio gaz / PE hebdomadaire des machines suivies avec son score et ses anomalies (par site et machine),
+# sur toutes les semaines des faits (voir charger_faits)
+def ratios_semaines(faits, annees=None):
+    return marquer(ratio_machines(faits, 'Semaine', annees).reset_index(drop=True), ['Site', 'Machine'], 'Semaine', ['Gaz (kWh/kg)'])
+
+
+# Vue de la page Machine : ratio par machine, ratio prédit par le modèle gaz / PE (avec le ratio
+# mesuré et le résidu), ou somme de l'indicateur par période et machine, pour tous les sites
+# ('Global'), un site ou une machine d'un site. Le ratio hebdomadaire est repris de faits.ratios
+# s'il est fourni (avec son score et ses anomalies).
+def agreger_machines(faits, site, machine, indicateur, periode, plage, annees=None, coefficients=None, ratios_semaine=None):
+    sites = None if site == 'Global' else [site]
+    machines = None if machine == 'Global' else [machine]
+    if indicateur in ('Gaz (kWh/kg)', PREDICTION):
+        if indicateur == PREDICTION:
+            df_filtered = predire(lignes(faits, 'Machine', sites, MACHINES_SUIVIES, annees), coefficients, periode)
+        elif periode == 'Semaine' and ratios_semaine is not None:
+            df_filtered = ratios_semaine
+        else:
+            df_filtered = ratio_machines(faits, periode, annees)
+        if site != 'Global':
+            df_filtered = df_filtered[df_filtered['Site'] == site]
+        if machine != 'Global':
+            df_filtered = df_filtered[df_filtered['Machine'] == machine]
+        return filtrer_plage(df_filtered, periode, plage)
+
+    df_filtered = agreger_faits(faits, 'Machine', [periode, 'Machine'], [indicateur], sites=sites, machines=machines, annees=annees)
+    return filtrer_plage(df_filtered, periode, plage)
+
+
+# Données du graphique : les lignes signalées comme anomalies sont écartées en mode 'Masquer'
+# (le tableau les garde)
+def donnees_graphique(df_grouped, indicateur, anomalies='Masquer'):
+    return filtrer_anomalies(df_grouped, indicateur, anomalies)
+
+
+# Format d'affichage des valeurs de chaque indicateur dans le tableau (printf), appliqué par le navigateur
+FORMATS = {'Gaz (kWh)': '%.0f', 'Electricité (kWh)': '%.0f', 'PE (kg)': '%.0f'}
+FORMAT_DEFAUT = '%.2f'
+
+# Format du score d'anomalie (écart à la médiane glissante, en MAD), affiché à côté du ratio
+FORMAT_SCORE = '%.1f'
+
+# Lignes par page du tableau : la grille n'affiche que les lignes visibles, seules les très grandes
+# vues sont découpées en pages
+LIGNES_PAR_PAGE = 5000
+
+
+def format_indicateur(indicateur):
+    return FORMATS.get(indicateur, FORMAT_DEFAUT)
+
+
+# Tableau affiché : libellés de période et valeurs numériques (triables), les valeurs nulles,
+# négatives ou infinies masquées (NaN) en une seule opération vectorisée. Le score d'anomalie
+# est gardé (vide pour les périodes sans production).
+def formater_tableau(df_grouped, periode, indicateur):
+    df_grouped = df_grouped.drop(columns=colonne_anomalie(indicateur), errors='ignore')
+    if periode in df_grouped.columns:
+        df_grouped[periode] = libeller(df_grouped[periode], periode)
+    if indicateur in df_grouped.columns:
+        valeurs = df_grouped[indicateur].astype('float64')
+        df_grouped[indicateur] = valeurs.where(np.isfinite(valeurs) & (valeurs > 0))
+    return df_grouped.reset_index(drop=True)
+
+
+def nombre_pages(lignes, lignes_par_page=LIGNES_PAR_PAGE):
+    return max(1, -(-lignes // lignes_par_page))
+
+
+# Lignes d'une page du tableau (pages numérotées à partir de 1)
+def page_tableau(tableau, page, lignes_par_page=LIGNES_PAR_PAGE):
+    return tableau.iloc[(page - 1) * lignes_par_page:page * lignes_par_page]
@@ -0,0 +1,96 @@
+import numpy as np
+import streamlit as st
+import toml
+from evolution import MESURES, PERIODES_EVOLUTION, charger_evolution, pivoter
+from graphiques import figure_evolution
+from ingestion import lister_snapshots, signature_fichier
+from periodes import libeller
+
+st.set_page_config(page_title="Tableau", layout="wide")
+
+# Fonction pour charger les informations d'authentification
+def load_config():
+    config = toml.load('.streamlit/config.toml')
+    return config['auth']['password']
+
+# Fonction de vérification du mot de passe
+def check_password(correct_password):
+    if 'authenticated' not in st.session_state:
+        st.session_state.authenticated = False
+
+    if st.session_state.authenticated:
+        return True  # L'utilisateur est déjà authentifié, ne rien demander
+
+    password = st.text_input("Mot de passe", type="password")
+    
+    if password == correct_password:
+        st.session_state.authenticated = True
+        return True  # Authentification réussie
+    elif password:
+        st.error("Mot de passe incorrect.")
+    
+    return False
+
+# Fonction principale
+def main():
+    # N'afficher le titre que si l'utilisateur n'est pas encore authentifié
+    if 'authenticated' not in st.session_state or not st.session_state.authenticated:
+        st.title("Application Sécurisée")
+    
+    correct_password = load_config()
+
+    # Vérification de l'authentification
+    if not check_password(correct_password):
+        st.stop()  # Arrêter l'exécution si l'authentification échoue
+
+
+if __name__ == "__main__":
+    main()
+
+# Historique des totaux : chaque export daté (Archive/ et data/) est lu en parallèle et réduit
+# aux totaux par site et par période (voir evolution.py) : tables export × site × période d'un type
+# d'export, recalculées seulement si un export est ajouté, retiré ou modifié (signature_fichier)
+@st.cache_data(max_entries=4, show_spinner="Lecture des exports datés…")
+def charger_historique(type_export, signatures):
+    return charger_evolution(type_export, chemins=[signature[0] for signature in signatures])
+
+# Charger l'image et afficher en haut à gauche
+image = "PT.jpg"  # Remplacez ce chemin par le chemin réel de votre image
+st.image(image)
+
+st.sidebar.title("Évolution d'un export à l'autre")
+type_choice = st.sidebar.radio("Type d'export", list(PERIODES_EVOLUTION))
+signatures = tuple(signature_fichier(chemin) for chemin in lister_snapshots(type_choice))
+if not signatures:
+    st.warning(f"Aucun export {type_choice} daté dans data/ ou Archive/.")
+    st.stop()
+evolution = charger_historique(type_choice, signatures)
+
+period_choice = st.sidebar.radio("Sélectionner la période", PERIODES_EVOLUTION[type_choice])
+table = evolution[period_choice]
+sites = sorted(site for site in table['Site'].unique() if site != 'Total')
+site_selection = st.sidebar.selectbox('Choisissez un site', ['Total'] + sites)
+energie_choice = st.sidebar.radio("Choisissez l'indicateur", MESURES[type_choice])
+
+# Une courbe par période : l'écart entre deux exports montre les valeurs révisées ou complétées
+lignes = table[table['Site'] == site_selection]
+fig = figure_evolution(lignes, period_choice, energie_choice)
+fig.update_layout(
+    title=f'{energie_choice} de {site_selection} selon l\'export',
+    title_font=dict(size=24),  # Taille du titre
+    xaxis_title='Export',
+    xaxis_title_font=dict(size=18),  # Taille du titre de l'axe X
+    xaxis=dict(color='white', tickfont=dict(size=14)),
+    yaxis_title=energie_choice,
+    yaxis_title_font=dict(size=18),  # Taille du titre de l'axe Y
+    yaxis=dict(color='white', tickfont=dict(size=16), showgrid=True, gridcolor='white', zerolinecolor='white'),
+    legend_title=period_choice,
+    height=500,  # Hauteur du graphique
+)
+st.plotly_chart(fig)
+
+# Tableau croisé : une ligne par export, une colonne par période
+tableau = pivoter(table, period_choice, site_selection, energie_choice)
+tableau.columns = tableau.columns.astype(str) if period_choice == 'Année' else np.asarray(libeller(tableau.columns.to_numpy(), period_choice))
+tableau.index = tableau.index.astype(str)
+st.dataframe(tableau.round(2))
@@ -1,10 +1,15 @@
-import pandas as pd
-import numpy as np
-import plotly.graph_objects as go
 import streamlit as st
-import plotly.express as px  # Pour accéder à des palettes de couleurs
 import toml
-from sklearn.linear_model import LinearRegression
+from periodes import cle_selection, options
+from faits import calendrier_faits, machines_site
+from graphiques import construire_figure
+from ingestion import dernier_snapshot, ingerer, lister_sites, magasin_courant, signature_fichier
+from memoire import rapport_memoire
+from anomalies import MODES, colonne_score
+from moteur import FORMAT_SCORE, agreger_machines, charger_faits, charger_snapshot, donnees_graphique, format_indicateur, formater_tableau, magasin_initialise, nombre_pages, page_tableau
+from prediction import PREDICTION, coefficients, modeles_en_ligne
+from requetes import agreger_machines_sql, moteurs
+from vues import config_cache, etat_cache, etat_partage, vue, vue_partagee
 
 st.set_page_config(page_title="Tableau", layout="wide")
 
@@ -48,26 +53,27 @@ def main():
 if __name__ == "__main__":
     main()
 
-# Chargement des données
-df2 = pd.read_csv("data/20260101 Machine_streamlit.csv", sep=";")
-df2 = df2[df2['Machine'] != 'F4B,']
-# Assurer que la colonne 'Date' est bien au format datetime
-#df2['Date'] = pd.to_datetime(df2['Date'], errors='coerce', dayfirst=True)
-
-# Extraire l'année, le mois et le jour
-#df2['Année'] = df2['Année'].dt.year
-#df2['Mois'] = df2['Mois'].dt.month
-#df2['Semaine'] = df2['Semaine'].dt.isocalendar().week
-#df2['Jour'] = df2['Date'].dt.date
-#df2['Jour'] = pd.to_datetime(df2['Jour'], errors='coerce', dayfirst=True)
-df2['Année'] = df2['Année'].astype(int)
-df2['Mois'] = df2['Mois'].astype(int)
-df2['Mois-Abrege'] = pd.to_datetime(df2['Mois'], format='%m').dt.strftime('%b')
-df2['Mois'] = df2['Année'] * 100 + df2['Mois']
-df2['Semaine'] = df2['Année'] * 100 + df2['Semaine']
-df2['Semaine_Formate'] = df2['Semaine'].apply(lambda x: f"S{int(str(x)[-2:]):02d} {str(x)[:4]}")
-df2['Mois_Formate'] = df2['Mois'].astype(str).str[:4] + '-' + df2['Mois'].astype(str).str[4:]
-df2 = df2[df2['Année'].isin([2023, 2024,2025])]
+# Chargement des données : dernier export daté de data/ ou Archive/, intégré de façon incrémentale
+# dans le magasin Parquet courant, partitionné par site et année (voir ingestion.py)
+FICHIER_DONNEES = dernier_snapshot('Machine')
+ANNEES = [2023, 2024, 2025]
+
+# Intégration du CSV dans le magasin courant, une seule fois par version du fichier
+@st.cache_data(max_entries=2, show_spinner=False)
+def preparer_magasin(chemin, mtime, taille):
+    return ingerer(chemin, magasin_courant('Machine'))
+
+# Occupation mémoire des données décodées de l'export (types par défaut / types compacts) pour le site choisi
+@st.cache_data(max_entries=4, show_spinner=False)
+def diagnostic_memoire(magasin, version, sites=None):
+    return rapport_memoire(charger_snapshot(magasin, 'Machine', ANNEES, sites))
+
+# Faits des deux pages (sites et machines, voir faits.py), partagés avec la page principale :
+# une seule copie en mémoire pour le processus, interrogée par codes de site, de machine et de calendrier
+version = signature_fichier(FICHIER_DONNEES)
+magasin = preparer_magasin(*version)
+faits = charger_faits(magasin_initialise('Global'), magasin)
+calendrier = calendrier_faits(faits, 'Machine', ANNEES)
 
 # Charger l'image et afficher en haut à gauche
 image = "PT.jpg"  # Remplacez ce chemin par le chemin réel de votre image
@@ -75,13 +81,12 @@ st.image(image)
 
 # Filtrage des données dans Streamlit
 st.sidebar.title("Filtrage des données")
-sites = df2['Site'].unique()
+sites = lister_sites(magasin)
 site_selection = st.sidebar.selectbox('Choisissez un site', ['Global'] + list(sites))
 
 # Filtrer les machines selon le site sélectionné
 if site_selection != "Global":
-    machines_site = df2[df2['Site'] == site_selection]['Machine'].unique()
-    machine_selection = st.sidebar.selectbox('Choisissez une Machine', ['Global'] + list(machines_site))
+    machine_selection = st.sidebar.selectbox('Choisissez une Machine', ['Global'] + machines_site(faits, site_selection, ANNEES))
 else:
     machine_selection = "Global"  # Ou aucune sélection de machine si le site est global
 
@@ -91,225 +96,121 @@ energie_choice = st.sidebar.radio("Choisissez l'indicateur", ['Gaz (kWh/kg)','PE
 # Choisir la période de filtrage
 period_choice = st.sidebar.radio("Sélectionner la période", ('Année', 'Mois', 'Semaine'))
 
-# Calcul des sommes de Gaz et Electricité selon la période choisie
-df_gaz = df2[df2['PE (kg)'] > 0]
-df_gaz = df_gaz.groupby([period_choice,'Machine', 'Site'])['Gaz (kWh)'].sum().reset_index()
-#df_electricite = df2.groupby([period_choice, 'Site'])['Electricité (kWh)'].sum().reset_index()
-
-
-# Filtrer les lignes où la valeur de 'Gaz (kWh)' est supérieure à 0
-df_pe = df2[df2['Gaz (kWh)'] > 0]
-# Calcul de la somme de PE (kg) par période et site
-df_pe = df_pe.groupby([period_choice,'Machine', 'Site'])['PE (kg)'].sum().reset_index()
-
-# Fusionner df_gaz et df_electricite
-#df_merged_gaz_elec = pd.merge(df_gaz, df_electricite, on=[period_choice, 'Site'], suffixes=('_gaz', '_elec'))
-
-# Fusionner le résultat avec df_pe
-df_merged = pd.merge(df_gaz, df_pe, on=[period_choice,'Machine', 'Site'], suffixes=('_gaz_elec', '_pe'))
-df_merged = df_merged[(df_merged['Machine'] == 'M2') | (df_merged['Machine'] == 'R2') | (df_merged['Machine'] == 'F4B') | (df_merged['Machine'] == 'Rock6')]
-df_merged['Gaz (kWh/kg)'] = df_merged['Gaz (kWh)'] / df_merged['PE (kg)']
-df_final = df_merged[[period_choice, 'Site','Machine', 'Gaz (kWh/kg)']]
+# Moteur de calcul des vues : faits en mémoire (pandas) ou DuckDB, qui applique la sélection et la plage
+# directement sur le magasin Parquet (proposé si DuckDB est installé), pour comparer les deux moteurs
+moteur_choice = 'pandas'
+if len(moteurs()) > 1:
+    moteur_choice = st.sidebar.radio("Moteur de calcul", moteurs())
 
+# Diagnostic de l'occupation mémoire (types par défaut / types compacts)
+diagnostic_choice = st.sidebar.checkbox("Diagnostic mémoire", value=False)
 
-# Filtrage des données par site
-if site_selection == 'Global':
-    if energie_choice == 'Gaz (kWh/kg)':
-        df_filtered = df_final
-    else:
-        # Si le site est 'Global', on groupe df2 par période et machine et on somme selon l'énergie choisie
-        df_filtered = df2.groupby([period_choice, 'Machine'])[energie_choice].sum().reset_index()
-else:
-    # Sinon, on filtre les données selon le site sélectionné
-    if machine_selection == 'Global':
-        if energie_choice == 'Gaz (kWh/kg)':
-            df_filtered = df_final[df_final['Site'] == site_selection]
-        else:
-            df_filtered = df2[df2['Site'] == site_selection]
-            df_filtered = df_filtered.groupby([period_choice, 'Machine'])[energie_choice].sum().reset_index()
-            # Si l'option 'Global' est choisie pour la machine, on groupe par période, site, et machine
-    else:
-        if energie_choice == 'Gaz (kWh/kg)':
-            df_filtered = df_final[(df_final['Site'] == site_selection) & (df_final['Machine'] == machine_selection)]
-        else:
-            # Si une machine spécifique est choisie, on filtre les données pour cette machine
-            df_filtered = df2[(df2['Site'] == site_selection) & (df2['Machine'] == machine_selection)]
- 
-# Filtrage selon la période choisie
+# Choix de la plage de périodes
 if period_choice == 'Année':
-    start_year = st.sidebar.selectbox("Année de début", sorted(df2['Année'].unique()),index=1)
-    end_year = st.sidebar.selectbox("Année de fin", sorted(df2['Année'].unique()),index=1)
-    df_filtered = df_filtered[(df_filtered['Année'] >= start_year) & (df_filtered['Année'] <= end_year)]
+    start_year = st.sidebar.selectbox("Année de début", sorted(calendrier['Année'].unique()),index=1)
+    end_year = st.sidebar.selectbox("Année de fin", sorted(calendrier['Année'].unique()),index=1)
+    plage = (start_year, end_year)
 elif period_choice == 'Mois':
     # Choisir l'année et le mois de début et de fin
-    start_year_month = st.sidebar.selectbox("Sélectionner le mois de début", sorted(df2['Mois_Formate'].unique()),index=12)
-    end_year_month = st.sidebar.selectbox("Sélectionner le mois de fin", sorted(df2['Mois_Formate'].unique()),index=20)
-    # Convertir la valeur sélectionnée en format d'origine (YYYYMM)
-    start_year_month_raw = int(start_year_month.replace('-', ''))
-    end_year_month_raw = int(end_year_month.replace('-', ''))
-    df_filtered = df_filtered[(df_filtered['Mois'] >= start_year_month_raw) & (df_filtered['Mois'] <= end_year_month_raw)]
-elif period_choice == 'Semaine':
-    start_week = st.sidebar.selectbox("Sélectionner la semaine de début", sorted(df2['Semaine_Formate'].unique(), key=lambda x: (int(x.split()[1]), int(x.split()[0][1:]))),index=52)
-    end_week = st.sidebar.selectbox("Sélectionner la semaine de fin", sorted(df2['Semaine_Formate'].unique(), key=lambda x: (int(x.split()[1]), int(x.split()[0][1:]))), index=87)
-    start_week_raw = int(start_week.split()[1]) * 100 + int(start_week.split()[0][1:])
-    end_week_raw = int(end_week.split()[1]) * 100 + int(end_week.split()[0][1:])
-
-    df_filtered = df_filtered[(df_filtered['Semaine'] >= start_week_raw) & (df_filtered['Semaine'] <= end_week_raw)]
+    start_year_month = st.sidebar.selectbox("Sélectionner le mois de début", options(calendrier['Mois'], 'Mois'),index=12)
+    end_year_month = st.sidebar.selectbox("Sélectionner le mois de fin", options(calendrier['Mois'], 'Mois'),index=20)
+    # Convertir la valeur sélectionnée en format d'origine (AAAAMM)
+    plage = (cle_selection(start_year_month, 'Mois'), cle_selection(end_year_month, 'Mois'))
 else:
-    start_day = pd.to_datetime(st.sidebar.date_input("Jour de début", pd.to_datetime('2024-01-01')))
-    end_day = pd.to_datetime(st.sidebar.date_input("Jour de fin", pd.to_datetime('2024-12-31')))
-    df_filtered = df_filtered[(df_filtered['Jour'] >= start_day) & (df_filtered['Jour'] <= end_day)]
-
-# Agrégation des données
-if energie_choice == 'Gaz (kWh/kg)' or energie_choice == 'Electricité (kWh/kg)':
-    energie_col = df_filtered
-    aggregation_method = 'median'
-elif energie_choice == 'Gaz (kWh)' or energie_choice == 'Electricité (kWh)':
-    energie_col = energie_choice
-    aggregation_method = 'sum'
-else:
-    energie_col = energie_choice
-    aggregation_method = 'sum'
-
-if period_choice == 'Année':
-    if aggregation_method == 'median':
-        df_grouped = df_filtered
+    start_week = st.sidebar.selectbox("Sélectionner la semaine de début", options(calendrier['Semaine'], 'Semaine'),index=52)
+    end_week = st.sidebar.selectbox("Sélectionner la semaine de fin", options(calendrier['Semaine'], 'Semaine'), index=87)
+    plage = (cle_selection(start_week, 'Semaine'), cle_selection(end_week, 'Semaine'))
+
+# Coefficients du modèle gaz / PE de toutes les machines : modèle en ligne (mis à jour avec les seules
+# semaines nouvelles, suit la dérive des machines) ou droite ajustée sur toutes les années affichées,
+# calculés une seule fois par contenu du magasin
+modele, modele_choice = None, None
+if energie_choice == PREDICTION:
+    modele_choice = st.sidebar.radio("Modèle gaz / PE", ['En ligne', 'Moindres carrés'])
+    modele = modeles_en_ligne(magasin) if modele_choice == 'En ligne' else coefficients(magasin, ANNEES)
+
+# Valeurs aberrantes du ratio hebdomadaire (par site et machine), détectées une seule fois avec les faits
+# (les deux moteurs reprennent les mêmes) : masquées sur le graphique ou marquées d'une croix rouge
+# (le tableau garde toutes les valeurs, avec leur score)
+anomalies_choice = 'Masquer'
+ratios = None
+if period_choice == 'Semaine' and energie_choice == 'Gaz (kWh/kg)':
+    anomalies_choice = st.sidebar.radio("Anomalies", MODES)
+    ratios = faits.ratios
+
+# Vue affichée : données groupées, figure et tableau mis en forme de la sélection
+def calculer_vue():
+    # Ratio gaz / PE des machines suivies (sommes conditionnelles en une seule passe), ratio prédit
+    # par le modèle, ou somme de l'indicateur par période et machine, pour la sélection et la plage choisies
+    if moteur_choice == 'DuckDB':
+        df_grouped = agreger_machines_sql(magasin, site_selection, machine_selection, energie_choice, period_choice, plage, ANNEES, modele, ratios)
     else:
-        df_grouped = df_filtered.groupby(['Année', 'Machine'])[energie_col].sum().reset_index()
-elif period_choice == 'Mois':
-    if aggregation_method == 'median':
-        df_grouped = df_filtered
-    else:
-        df_grouped = df_filtered.groupby(['Mois', 'Machine'])[energie_col].sum().reset_index()
-elif period_choice == 'Semaine':  # Ajout de la condition pour la semaine
-    if aggregation_method == 'median':
-        df_grouped = df_filtered
-    else:
-        df_grouped = df_filtered.groupby(['Semaine', 'Machine'])[energie_col].sum().reset_index()
-else:
-    if aggregation_method == 'median':
-        df_grouped = df_filtered
-    else:
-        df_grouped = df_filtered.groupby(['Jour', 'Machine'])[energie_col].sum().reset_index()
+        df_grouped = agreger_machines(faits, site_selection, machine_selection, energie_choice, period_choice, plage, ANNEES, modele, ratios)
+
+    # Graphique construit en une seule passe sur les données groupées (une série par machine) ;
+    # si une seule machine est affichée pour un site choisi, la série est affichée en bleu
+    fig = construire_figure(donnees_graphique(df_grouped, energie_choice, anomalies_choice), period_choice, 'Machine', energie_choice,
+                            couleur_unique=site_selection != 'Global', evidence=anomalies_choice == 'Mettre en évidence')
+
+    # Mise à jour des axes et titres
+    fig.update_layout(
+        barmode='group',
+        title=f'Consommation d\'énergie pour {site_selection}',
+        title_font=dict(size=24),  # Taille du titre
+        xaxis_title_font=dict(size=18),  # Taille du titre de l'axe X
+        xaxis=dict(
+            color='white',  # Change la couleur des axes X en blanc
+            type='category',
+            tickfont=dict(size=16),  # Taille des labels des ticks de l'axe X            
+        ),
+        yaxis_title=f'Consommation ({energie_choice})',
+        yaxis_title_font=dict(size=18),  # Taille du titre de l'axe Y
+        yaxis=dict(
+            color='white',  # Change la couleur des axes Y en blanc
+            tickfont=dict(size=16),  # Taille des labels des ticks de l'axe Y
+            showgrid=True,  # Afficher la grille
+            gridcolor='white',  # Change la couleur de la grille en blan
+            zerolinecolor='white',  # Change la couleur de la ligne zéro
+        ),
+        legend_title="Site",
+        height=500,  # Hauteur du graphique
+        width=2000,  # Largeur du graphique
 
-# Créer une palette de couleurs distinctes
-color_palette = px.colors.qualitative.Light24  # Palette de couleurs pré-définie
+    )
 
-# Création du graphique avec Plotly
-fig = go.Figure()
+    # Tableau mis en forme, sans l'index
+    return df_grouped, fig, formater_tableau(df_grouped, period_choice, energie_choice)
 
-# Ajouter les sous-graphes avec des couleurs différentes pour chaque site
-for idx, machine_selection in enumerate(df_grouped['Machine'].unique()):
-    site_data = df_grouped[df_grouped['Machine'] == machine_selection]
-    color = color_palette[idx % len(color_palette)]  # Assurer une couleur unique pour chaque site
-        # Si un seul site est sélectionné, appliquer la couleur bleue
-    if site_selection != 'Global' and len(df_grouped['Machine'].unique()) == 1:
-        color = 'Lightblue'
-    else:
-        color = color_palette[idx % len(color_palette)]  # Assurer une couleur unique pour chaque site
-
-    if period_choice == 'Année':
-        fig.add_trace(go.Bar(
-            x=site_data['Année'],
-            y=site_data[energie_choice],
-            name=machine_selection,
-            marker=dict(color=color)
-        ))
-    elif period_choice == 'Mois':
-
-        # Mise en forme de la semaine pour afficher mois et année (ex : 202301 -> Janvier 2023)
-
-        site_data['Mois'] = site_data['Mois'].apply(
-            lambda x: f"{pd.to_datetime(str(x), format='%Y%m').strftime('%B %Y')}" if period_choice == 'Mois' else x
-        )
-
-        # Trier les données par mois (dans l'ordre croissant des dates)
-        site_data['Mois'] = pd.to_datetime(site_data['Mois'], format='%B %Y')
-        site_data = site_data.sort_values(by='Mois')
-
-        # Ajout des traces pour le graphique
-        fig.add_trace(go.Bar(
-        x=site_data['Mois'].dt.strftime('%B %Y'),  # Reformater le mois pour l'affichage
-        y=site_data[energie_choice],
-        name=machine_selection,
-        marker=dict(color=color)
-        ))
-    elif period_choice == 'Semaine':
-        site_data['Semaine'] = site_data['Semaine'].apply(
-            lambda x: f"S{int(str(x)[-2:]):02d} {str(x)[:4]}" if period_choice == 'Semaine' else x
-        )
-        
-        fig.add_trace(go.Bar(
-            x=site_data['Semaine'],
-            y=site_data[energie_choice],
-            name=machine_selection,
-            marker=dict(color=color)
-        ))
-    else:
-        if energie_choice == 'Gaz (kWh/kg)':
-            site_data = site_data[site_data[energie_choice] < 15]
-
-        if energie_choice == 'Electricité (kWh/kg)':
-            site_data = site_data[site_data[energie_choice] < 7]
-
-        site_data['Jour'] = site_data['Jour'].apply(
-            lambda x: f"{str(x)[:10]}" if period_choice == 'Jour' else x
-        )
-        fig.add_trace(go.Bar(
-            x=site_data['Jour'],
-            y=site_data[energie_choice],
-            name=machine_selection,
-            marker=dict(color=color)
-        ))
-
-# Mise à jour des axes et titres
-fig.update_layout(
-    barmode='group',
-    title=f'Consommation d\'énergie pour {site_selection}',
-    title_font=dict(size=24),  # Taille du titre
-    xaxis_title_font=dict(size=18),  # Taille du titre de l'axe X
-    xaxis=dict(
-        color='white',  # Change la couleur des axes X en blanc
-        type='category',
-        tickfont=dict(size=16),  # Taille des labels des ticks de l'axe X            
-    ),
-    yaxis_title=f'Consommation ({energie_choice})',
-    yaxis_title_font=dict(size=18),  # Taille du titre de l'axe Y
-    yaxis=dict(
-        color='white',  # Change la couleur des axes Y en blanc
-        tickfont=dict(size=16),  # Taille des labels des ticks de l'axe Y
-        showgrid=True,  # Afficher la grille
-        gridcolor='white',  # Change la couleur de la grille en blan
-        zerolinecolor='white',  # Change la couleur de la ligne zéro
-    ),
-    legend_title="Site",
-    height=500,  # Hauteur du graphique
-    width=2000,  # Largeur du graphique
-
-)
+# Les vues déjà affichées dans la session (clé : export, sélection et plage) sont servies sans recalcul ;
+# sinon la vue est reprise du cache partagé par les sessions, vidé à l'arrivée d'un nouvel export
+cle_vue = (version, moteur_choice, site_selection, machine_selection, energie_choice, period_choice, plage, anomalies_choice, modele_choice)
+df_grouped, fig, tableau = vue(st.session_state, cle_vue,
+                                lambda: vue_partagee('Machine', version, cle_vue, calculer_vue, *config_cache()))
 
 # Affichage du graphique dans Streamlit
-if period_choice in df_grouped.columns:
-    df_grouped[period_choice] = df_grouped[period_choice].apply(
-        lambda x: f"{pd.to_datetime(str(x), format='%Y%m').strftime('%B %Y')}" if period_choice == 'Mois' else
-                  f"{x:,.0f}".replace(',', '') if period_choice == 'Année' else
-                  f"S{int(str(x)[-2:]):02d} {str(x)[:4]}" if period_choice == 'Semaine' else
-                  f"{str(x)[:10]}" if period_choice == 'Jour' else x
-                  
-
-)
-if energie_choice in df_grouped.columns:
-    df_grouped[energie_choice] = df_grouped[energie_choice].apply(
-        lambda x: "" if (x <= 0 or pd.isna(x) or x == float('inf') or x == float('-inf'))
-                  else f"{x:,.0f}".replace(',', '') if energie_choice in ['Gaz (kWh)', 'Electricité (kWh)', 'PE (kg)'] 
-                  else f"{x:,.2f}".replace(',', '')
-    )
-
-
 st.plotly_chart(fig)
 
-# Réinitialiser l'index et ne pas l'afficher
-df_grouped_reset = df_grouped.reset_index(drop=True)
-
-# Afficher sans l'index
-st.write(df_grouped_reset)
\ No newline at end of file
+# Tableau numérique (triable) sans l'index, dans une grille qui ne dessine que les lignes visibles ;
+# le format des nombres et le masquage des valeurs vides sont appliqués par le navigateur
+pages_tableau = nombre_pages(len(tableau))
+page = st.number_input("Page du tableau", min_value=1, max_value=pages_tableau, value=1) if pages_tableau > 1 else 1
+st.dataframe(page_tableau(tableau, page), hide_index=True,
+             column_config={energie_choice: st.column_config.NumberColumn(format=format_indicateur(energie_choice)),
+                            colonne_score(energie_choice): st.column_config.NumberColumn(format=FORMAT_SCORE)})
+
+# Coefficients des droites Gaz (kWh) = Pente × PE (kg) + Ordonnée des machines affichées
+if modele is not None:
+    st.subheader("Modèle gaz / PE")
+    machines_affichees = modele['Machine'].isin(df_grouped['Machine'].unique()) & modele['Site'].isin(df_grouped['Site'].unique())
+    st.dataframe(modele[machines_affichees], hide_index=True)
+
+# Octets par colonne avec les types par défaut et avec les types compacts
+if diagnostic_choice:
+    st.subheader("Diagnostic mémoire")
+    st.dataframe(diagnostic_memoire(magasin, version, None if site_selection == 'Global' else (site_selection,)), hide_index=True)
+    st.subheader("Table de faits des deux pages (codes entiers)")
+    st.dataframe(rapport_memoire(faits.faits), hide_index=True)
+    st.subheader("Cache des vues de la session")
+    st.write(etat_cache(st.session_state))
+    st.subheader("Cache des vues partagé entre les sessions")
+    st.write(etat_partage())
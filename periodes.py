@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+# Libellés des périodes, calculés une seule fois par valeur distincte puis reportés sur les lignes
+# par leurs codes : le coût dépend du nombre de périodes distinctes, pas du nombre de lignes.
+# Les clés de période (AAAA, AAAAT, AAAAMM, AAAASS, dates) sont déjà dans l'ordre chronologique
+# et servent directement de clé de tri.
+
+
+# Libellés du graphique et du tableau : "2024", "Q1 2024", "January 2024", "S01 2024", "2024-01-31"
+def _affichage(cles, periode):
+    if periode == 'Trimestre':
+        return 'Q' + (cles % 10).astype(str) + ' ' + (cles // 10).astype(str)
+    if periode == 'Mois':
+        return pd.to_datetime(cles.astype(str), format='%Y%m').strftime('%B %Y')
+    if periode == 'Semaine':
+        return 'S' + (cles % 100).astype(str).str.zfill(2) + ' ' + (cles // 100).astype(str)
+    if periode == 'Jour':
+        return pd.DatetimeIndex(cles).strftime('%Y-%m-%d')
+    return cles.astype(str)
+
+
+# Libellés des listes de sélection de la barre latérale : "2024-Q1", "2024-01", "S01 2024"
+def _selection(cles, periode):
+    if periode == 'Trimestre':
+        return (cles // 10).astype(str) + '-Q' + (cles % 10).astype(str)
+    if periode == 'Mois':
+        return (cles // 100).astype(str) + '-' + (cles % 100).astype(str).str.zfill(2)
+    return _affichage(cles, periode)
+
+
+# Mois abrégé ("Jan", "Feb", ...) d'une clé AAAAMM
+def _abrege(cles, periode):
+    return pd.to_datetime(cles.astype(str), format='%Y%m').strftime('%b')
+
+
+STYLES = {'affichage': _affichage, 'selection': _selection, 'abrege': _abrege}
+
+
+# Libellés d'une colonne de période, renvoyés sous forme catégorielle ordonnée chronologiquement
+def libeller(valeurs, periode, style='affichage'):
+    codes, cles = pd.factorize(valeurs, sort=True)
+    etiquettes = pd.Index(STYLES[style](pd.Index(cles), periode))
+    categories = etiquettes.unique()
+    if len(categories) < len(etiquettes):
+        # Plusieurs clés partagent un libellé (ex : "Jan" de chaque année)
+        codes = np.where(codes >= 0, categories.get_indexer(etiquettes)[codes], -1)
+    libelles = pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(categories, ordered=True))
+    if isinstance(valeurs, pd.Series):
+        return pd.Series(libelles, index=valeurs.index, name=valeurs.name)
+    return libelles
+
+
+# Options d'une liste de sélection : libellés des périodes distinctes, dans l'ordre chronologique
+def options(valeurs, periode, style='selection'):
+    cles = pd.Index(np.sort(pd.unique(np.asarray(valeurs))))
+    return list(STYLES[style](cles, periode))
+
+
+# Clé de période d'un libellé de sélection ("2024-Q1" -> 20241, "2024-01" -> 202401, "S01 2024" -> 202401)
+def cle_selection(libelle, periode):
+    if periode == 'Trimestre':
+        return int(libelle.replace('-Q', ''))
+    if periode == 'Mois':
+        return int(libelle.replace('-', ''))
+    if periode == 'Semaine':
+        semaine, annee = libelle.split()
+        return int(annee) * 100 + int(semaine[1:])
+    return libelle
+
+
+# Année civile de chaque clé de période
+def annee_periode(cles, periode):
+    if periode == 'Jour':
+        return cles.dt.year
+    return cles // {'Année': 1, 'Trimestre': 10, 'Mois': 100, 'Semaine': 100}[periode]
@@ -0,0 +1,238 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from agregats import agreger
+from ingestion import DOSSIER_MAGASIN, MACHINE_DOUBLON, dernier_snapshot, empreinte_magasin, ingerer, lire_magasin, lire_manifeste, lire_partitions, magasin_courant
+
+# Prédiction du gaz des machines : pour chaque couple (site, machine), droite Gaz (kWh) = pente × PE (kg) + ordonnée
+# ajustée par moindres carrés sur les lignes hebdomadaires où gaz et PE sont positifs.
+# Tous les couples sont ajustés ensemble : les équations normales 2 × 2 sont construites en une seule
+# passe groupée puis résolues en un seul appel vectorisé. Le modèle étant linéaire, le gaz prédit se
+# somme sur n'importe quelle période : les prédictions d'une sélection ne demandent aucun réajustement.
+
+PREDICTION = 'Prédiction Gaz (kwh/kg)'
+RESIDU = 'Résidu (kwh/kg)'
+
+# Nombre de jeux de coefficients gardés en mémoire (un par contenu du magasin et années)
+ENTREES_CACHE = 4
+
+_cache = {}
+_verrou = threading.Lock()
+
+# Modèles en ligne (moindres carrés récursifs) : état enregistré à côté du magasin, mis à jour
+# avec les seules semaines nouvelles de chaque export
+FICHIER_MODELES = os.path.join(DOSSIER_MAGASIN, 'modeles', 'gaz_machines.json')
+
+# Facteur d'oubli exponentiel : 1 = toutes les semaines pèsent autant, 0.99 = mémoire d'environ
+# 100 semaines, le modèle suit la dérive du rendement des machines
+OUBLI = 0.99
+
+# Le PE est exprimé en tonnes dans le modèle en ligne (pente et ordonnée du même ordre de grandeur)
+ECHELLE_PE = 1000.0
+COVARIANCE_INITIALE = 1e6
+COLONNES_ETAT = ['Site', 'Machine', 't0', 't1', 'p00', 'p01', 'p10', 'p11', 'Lignes', 'Derniere']
+
+
+# Lignes retenues pour l'ajustement et la comparaison : gaz et PE positifs, hors machine en doublon
+def lignes_productives(df2):
+    return df2[(df2['Gaz (kWh)'] > 0) & (df2['PE (kg)'] > 0) & (df2['Machine'] != MACHINE_DOUBLON)]
+
+
+# Coefficients de tous les couples (site, machine) : Site, Machine, Pente, Ordonnée, Lignes.
+# Les couples à moins de deux lignes ou à PE constant ont des coefficients NaN.
+def ajuster(df2):
+    lignes = lignes_productives(df2)
+    x = lignes['PE (kg)'].astype('float64')
+    y = lignes['Gaz (kWh)'].astype('float64')
+    sommes = agreger(pd.DataFrame({
+        'Site': lignes['Site'], 'Machine': lignes['Machine'],
+        'x': x, 'y': y, 'xx': x * x, 'xy': x * y, 'n': np.ones(len(lignes)),
+    }), ['Site', 'Machine'], ['x', 'y', 'xx', 'xy', 'n'])
+
+    # Équations normales [[Σx², Σx], [Σx, n]] · [pente, ordonnée] = [Σxy, Σy]
+    matrices = np.stack([
+        np.stack([sommes['xx'], sommes['x']], axis=-1),
+        np.stack([sommes['x'], sommes['n']], axis=-1),
+    ], axis=1)
+    seconds_membres = np.stack([sommes['xy'], sommes['y']], axis=-1)
+    determinants = sommes['n'] * sommes['xx'] - sommes['x'] ** 2
+    valides = ((sommes['n'] >= 2) & (determinants > 1e-9 * sommes['xx'] * sommes['n'])).to_numpy()
+    matrices[~valides] = np.eye(2)
+    solutions = np.linalg.solve(matrices, seconds_membres[..., None])[..., 0]
+    solutions[~valides] = np.nan
+
+    return pd.DataFrame({
+        'Site': sommes['Site'], 'Machine': sommes['Machine'],
+        'Pente': solutions[:, 0], 'Ordonnée': solutions[:, 1], 'Lignes': sommes['n'].astype('int64'),
+    })
+
+
+# Coefficients d'un magasin, ajustés une seule fois par contenu (empreinte des partitions) et années,
+# sur tous les sites quelle que soit la sélection affichée
+def coefficients(magasin, annees):
+    cle = (empreinte_magasin(magasin), tuple(annees))
+    with _verrou:
+        if cle not in _cache:
+            df2 = lire_magasin(magasin, annees=annees, colonnes=['Site', 'Machine', 'Gaz (kWh)', 'PE (kg)'], compact=True)
+            _cache[cle] = ajuster(df2)
+            while len(_cache) > ENTREES_CACHE:
+                del _cache[next(iter(_cache))]
+        return _cache[cle]
+
+
+# Ratio prédit, ratio mesuré et résidu (mesuré - prédit) par période, machine et site,
+# calculés sur les mêmes lignes (gaz et PE positifs)
+def predire(df2, coefficients, periode):
+    lignes = lignes_productives(df2)
+    modele = lignes[['Site', 'Machine']].astype(str).merge(
+        coefficients.astype({'Site': str, 'Machine': str}), on=['Site', 'Machine'], how='left')
+    pe = lignes['PE (kg)'].to_numpy(dtype='float64')
+    gaz_predit = modele['Pente'].to_numpy() * pe + modele['Ordonnée'].to_numpy()
+
+    sommes = agreger(pd.DataFrame({
+        periode: lignes[periode], 'Machine': lignes['Machine'], 'Site': lignes['Site'],
+        'Gaz (kWh)': lignes['Gaz (kWh)'], 'PE (kg)': pe, 'Gaz prédit (kWh)': gaz_predit,
+        'Lignes prédites': np.isfinite(gaz_predit),
+    }), [periode, 'Machine', 'Site'], ['Gaz (kWh)', 'PE (kg)', 'Gaz prédit (kWh)', 'Lignes prédites'])
+    # Pas de prédiction pour les machines sans modèle (la somme des NaN vaudrait 0)
+    sommes[PREDICTION] = (sommes['Gaz prédit (kWh)'] / sommes['PE (kg)']).where(sommes['Lignes prédites'] > 0)
+    sommes['Gaz (kWh/kg)'] = sommes['Gaz (kWh)'] / sommes['PE (kg)']
+    sommes[RESIDU] = sommes['Gaz (kWh/kg)'] - sommes[PREDICTION]
+    return sommes[[periode, 'Site', 'Machine', PREDICTION, 'Gaz (kWh/kg)', RESIDU]]
+
+
+# Clé chronologique d'une ligne hebdomadaire AAAASSMM : la semaine ISO 52/53 des premiers jours
+# de janvier passe avant la semaine 1, la semaine 1 des derniers jours de décembre après la 52
+def cle_chronologique(df):
+    semaine = df['Semaine'].astype('int32')
+    semaine = semaine.where(~((df['Mois'] == 1) & (semaine >= 52)), 0)
+    semaine = semaine.where(~((df['Mois'] == 12) & (semaine == 1)), 54)
+    return df['Année'].astype('int32') * 10000 + semaine * 100 + df['Mois'].astype('int32')
+
+
+def lire_etat(chemin):
+    if not os.path.exists(chemin):
+        return None
+    with open(chemin, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# L'état garde les empreintes des partitions intégrées : la mise à jour suivante ne relit que les autres
+def ecrire_etat(chemin, empreinte, oubli, modeles, partitions):
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    # Fichier temporaire au nom unique : deux processus qui enregistrent en même temps n'écrivent
+    # jamais dans le même fichier, le dernier renommage l'emporte
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(chemin),
+                                     prefix=os.path.basename(chemin) + '.', suffix='.tmp', delete=False) as f:
+        temporaire = f.name
+        json.dump({'empreinte': empreinte, 'oubli': oubli, 'partitions': partitions,
+                   'modeles': modeles.to_dict('records')}, f, ensure_ascii=False)
+    os.replace(temporaire, chemin)
+
+
+# Une étape des moindres carrés récursifs pour plusieurs machines à la fois (une ligne par machine) :
+# theta (m, 2), covariances (m, 2, 2), x (m, 2), y (m,)
+def etape_rls(theta, covariances, x, y, oubli):
+    px = np.einsum('mij,mj->mi', covariances, x)
+    gains = px / (oubli + np.einsum('mi,mi->m', x, px))[:, None]
+    erreurs = y - np.einsum('mi,mi->m', x, theta)
+    theta = theta + gains * erreurs[:, None]
+    covariances = (covariances - np.einsum('mi,mj->mij', gains, px)) / oubli
+    return theta, covariances
+
+
+# Intégration des lignes postérieures à la dernière semaine vue par chaque modèle.
+# Les machines avancent ensemble : l'étape r traite la r-ième nouvelle ligne de chaque machine,
+# le coût ne dépend que du nombre de semaines nouvelles.
+def integrer_semaines(modeles, df2, oubli):
+    lignes = lignes_productives(df2)
+    lignes = lignes.assign(Site=lignes['Site'].astype(str), Machine=lignes['Machine'].astype(str),
+                           _cle=cle_chronologique(lignes).to_numpy())
+
+    nouveaux = lignes[['Site', 'Machine']].drop_duplicates()
+    nouveaux = nouveaux.merge(modeles[['Site', 'Machine']], how='left', indicator=True)
+    nouveaux = nouveaux[nouveaux['_merge'] == 'left_only'].drop(columns='_merge')
+    if len(nouveaux):
+        initial = {'t0': 0.0, 't1': 0.0, 'p00': COVARIANCE_INITIALE, 'p01': 0.0, 'p10': 0.0,
+                   'p11': COVARIANCE_INITIALE, 'Lignes': 0, 'Derniere': 0}
+        nouveaux = nouveaux.assign(**initial)[COLONNES_ETAT]
+        modeles = pd.concat([modeles, nouveaux], ignore_index=True) if len(modeles) else nouveaux.reset_index(drop=True)
+
+    couples = pd.MultiIndex.from_frame(modeles[['Site', 'Machine']])
+    indices = couples.get_indexer(pd.MultiIndex.from_frame(lignes[['Site', 'Machine']]))
+    nouvelles = lignes['_cle'].to_numpy() > modeles['Derniere'].to_numpy()[indices]
+    lignes, indices = lignes[nouvelles], indices[nouvelles]
+    if not len(lignes):
+        return modeles
+
+    ordre = np.lexsort((lignes['_cle'].to_numpy(), indices))
+    indices = indices[ordre]
+    x = np.stack([lignes['PE (kg)'].to_numpy(dtype='float64')[ordre] / ECHELLE_PE, np.ones(len(ordre))], axis=-1)
+    y = lignes['Gaz (kWh)'].to_numpy(dtype='float64')[ordre]
+    rangs = pd.Series(indices).groupby(indices).cumcount().to_numpy()
+
+    theta = modeles[['t0', 't1']].to_numpy(dtype='float64')
+    covariances = modeles[['p00', 'p01', 'p10', 'p11']].to_numpy(dtype='float64').reshape(-1, 2, 2)
+    for rang in range(rangs.max() + 1):
+        etape = rangs == rang
+        machines = indices[etape]
+        theta[machines], covariances[machines] = etape_rls(theta[machines], covariances[machines], x[etape], y[etape], oubli)
+
+    modeles[['t0', 't1']] = theta
+    modeles[['p00', 'p01', 'p10', 'p11']] = covariances.reshape(-1, 4)
+    modeles['Lignes'] += np.bincount(indices, minlength=len(modeles))
+    derniere = pd.Series(lignes['_cle'].to_numpy()[ordre]).groupby(indices).max()
+    modeles.loc[derniere.index, 'Derniere'] = derniere.to_numpy()
+    return modeles
+
+
+# Coefficients des modèles en ligne d'un magasin (même forme que coefficients()) : l'état enregistré
+# n'est mis à jour que si le contenu du magasin a changé, avec ses seules semaines nouvelles, lues
+# dans les seules partitions (site, année) dont l'empreinte diffère de celle enregistrée.
+# Les révisions de semaines déjà intégrées ne sont pas reprises : utiliser reinitialiser=True.
+def modeles_en_ligne(magasin, oubli=OUBLI, chemin=FICHIER_MODELES, reinitialiser=False):
+    empreinte = empreinte_magasin(magasin)
+    cle = ('en ligne', empreinte, oubli, chemin)
+    with _verrou:
+        if cle not in _cache or reinitialiser:
+            etat = None if reinitialiser else lire_etat(chemin)
+            if etat is not None and etat['oubli'] == oubli:
+                modeles = pd.DataFrame(etat['modeles'], columns=COLONNES_ETAT)
+            else:
+                modeles = pd.DataFrame(columns=COLONNES_ETAT).astype({'Lignes': 'int64', 'Derniere': 'int64'})
+            if etat is None or etat['empreinte'] != empreinte or etat['oubli'] != oubli:
+                manifeste = lire_manifeste(magasin)['partitions']
+                integrees = set()
+                if etat is not None and etat['oubli'] == oubli:
+                    integrees = {tuple(partition) for partition in etat.get('partitions', [])}
+                partitions = [(site, annee) for site, annee, contenu in manifeste if (site, annee, contenu) not in integrees]
+                if partitions:
+                    colonnes = ['Site', 'Année', 'Semaine', 'Mois', 'Machine', 'Gaz (kWh)', 'PE (kg)']
+                    modeles = integrer_semaines(modeles, lire_partitions(magasin, partitions, colonnes, compact=True), oubli)
+                ecrire_etat(chemin, empreinte, oubli, modeles, manifeste)
+            _cache[cle] = pd.DataFrame({
+                'Site': modeles['Site'], 'Machine': modeles['Machine'],
+                'Pente': (modeles['t0'] / ECHELLE_PE).where(modeles['Lignes'] >= 2),
+                'Ordonnée': modeles['t1'].where(modeles['Lignes'] >= 2),
+                'Lignes': modeles['Lignes'].astype('int64'),
+            })
+            while len(_cache) > ENTREES_CACHE:
+                del _cache[next(iter(_cache))]
+        return _cache[cle]
+
+
+# Mise à jour des modèles en ligne avec le dernier export Machine :
+# python prediction.py [--oubli 0.99] [--reinitialiser]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mise à jour des modèles gaz / PE en ligne")
+    parser.add_argument('--oubli', type=float, default=OUBLI)
+    parser.add_argument('--reinitialiser', action='store_true')
+    args = parser.parse_args()
+    magasin = ingerer(dernier_snapshot('Machine'), magasin_courant('Machine'))
+    print(modeles_en_ligne(magasin, args.oubli, reinitialiser=args.reinitialiser).to_string(index=False))
@@ -0,0 +1,104 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from agregats import PERIODES, construire_cube_par_lots, extraire
+from ingestion import dernier_snapshot, ingerer_increment, lister_sites, magasin_courant
+from moteur import INDICATEURS, charger_par_lots
+from periodes import libeller
+
+# Export par lots des tableaux du tableau de bord : pour chaque site (plus 'Global' et 'Total'),
+# chaque indicateur et chaque période, la table affichée par la page principale.
+# Le cube période × site est calculé une seule fois puis partagé par les processus, qui ne font
+# que le découper et écrire un classeur par site.
+DOSSIER_RAPPORTS = 'rapports'
+ANNEES = [2023, 2024, 2025, 2026]
+FORMATS = ('excel', 'parquet')
+
+# Noms courts des indicateurs pour les onglets Excel (31 caractères au plus, sans '/')
+ABREVIATIONS = {
+    'Gaz (kWh/kg)': 'Gaz kWh-kg',
+    'Electricité (kWh/kg)': 'Elec kWh-kg',
+    'Empreinte carbone (tCO2)': 'tCO2',
+    'Gaz (kWh)': 'Gaz kWh',
+    'Electricité (kWh)': 'Elec kWh',
+    'PE (kg)': 'PE kg',
+}
+
+# Cube partagé, transmis une seule fois à chaque processus
+_cube = None
+
+
+def _initialiser(cube):
+    global _cube
+    _cube = cube
+
+
+# Cube de l'export courant (construit lot par lot), avec les libellés de période calculés une fois pour toutes les tables
+def preparer_cube(annees=ANNEES):
+    magasin = magasin_courant('Global')
+    ingerer_increment(dernier_snapshot('Global'), magasin)
+    cube = construire_cube_par_lots(charger_par_lots(magasin, 'Global', annees))
+    for periode, table in cube.items():
+        table.insert(1, 'Libellé', libeller(table[periode], periode).astype(str))
+    return cube, ['Global'] + lister_sites(magasin) + ['Total']
+
+
+# Table d'un site, d'une période et d'un indicateur ; les valeurs sont arrondies à 3 décimales
+# comme dans les exports (les mesures sont stockées en float32)
+def table_rapport(cube, site, periode, indicateur):
+    lignes = extraire(cube, periode, site, indicateur).index
+    table = cube[periode].loc[lignes, [periode, 'Libellé', 'Site', indicateur]].reset_index(drop=True)
+    return table.round({indicateur: 3})
+
+
+# Un classeur par site : un onglet (Excel) ou un fichier (Parquet) par période et indicateur
+def ecrire_site(site, dossier, format_rapport, periodes, indicateurs):
+    if format_rapport == 'excel':
+        chemin = os.path.join(dossier, f'{site}.xlsx')
+        with pd.ExcelWriter(chemin, engine='openpyxl') as classeur:
+            for periode in periodes:
+                for indicateur in indicateurs:
+                    table_rapport(_cube, site, periode, indicateur).to_excel(
+                        classeur, sheet_name=f'{periode} {ABREVIATIONS[indicateur]}', index=False)
+    else:
+        chemin = os.path.join(dossier, site)
+        os.makedirs(chemin, exist_ok=True)
+        for periode in periodes:
+            for indicateur in indicateurs:
+                table_rapport(_cube, site, periode, indicateur).to_parquet(
+                    os.path.join(chemin, f'{periode} {ABREVIATIONS[indicateur]}.parquet'), index=False)
+    return chemin
+
+
+def exporter(dossier, format_rapport='excel', sites=None, annees=ANNEES, periodes=PERIODES,
+             indicateurs=INDICATEURS, processus=None):
+    cube, tous_sites = preparer_cube(annees)
+    os.makedirs(dossier, exist_ok=True)
+    sites = tous_sites if sites is None else sites
+    with ProcessPoolExecutor(max_workers=processus, initializer=_initialiser, initargs=(cube,)) as executeur:
+        taches = [executeur.submit(ecrire_site, site, dossier, format_rapport, periodes, indicateurs) for site in sites]
+        return [tache.result() for tache in taches]
+
+
+# Pack mensuel : python rapports.py [--format excel|parquet] [--dossier rapports/202606] [--sites PTWE35 Total]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export par lots des tableaux site × indicateur × période")
+    parser.add_argument('--format', dest='format_rapport', choices=FORMATS, default='excel')
+    parser.add_argument('--dossier', default=DOSSIER_RAPPORTS)
+    parser.add_argument('--sites', nargs='+')
+    parser.add_argument('--annees', nargs='+', type=int, default=ANNEES)
+    parser.add_argument('--periodes', nargs='+', choices=PERIODES, default=PERIODES)
+    parser.add_argument('--processus', type=int)
+    args = parser.parse_args()
+
+    debut = time.perf_counter()
+    chemins = exporter(args.dossier, args.format_rapport, args.sites, args.annees, args.periodes, INDICATEURS, args.processus)
+    for chemin in chemins:
+        print(chemin)
+    print(f"{len(chemins)} classeur(s), {len(chemins) * len(args.periodes) * len(INDICATEURS)} table(s) "
+          f"en {time.perf_counter() - debut:.1f} s", file=sys.stderr)
@@ -0,0 +1,231 @@
+import argparse
+import importlib.util
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from agregats import PERIODES, SOMMES, SOMMES_MACHINE, assembler_cube
+from faits import CALENDRIER, cube_faits
+from ingestion import MACHINE_DOUBLON
+from moteur import MACHINES_SUIVIES, agreger_machines, charger_faits, filtrer_plage, magasin_initialise
+from prediction import PREDICTION, predire
+
+# Moteur SQL embarqué (DuckDB) des deux pages : les filtres de site, de machine, d'année et de plage
+# de périodes et les agrégations période × site sont exécutés directement sur les fichiers Parquet
+# du magasin, sans charger ses lignes dans un DataFrame. Seules les colonnes utiles sont lues et
+# seules les partitions Site=/Année= retenues sont ouvertes ; DuckDB répartit la lecture et
+# l'agrégation des partitions sur tous les cœurs. Les résultats ont les colonnes et les types du
+# moteur pandas (moteur.py, faits.py), pour comparer les deux moteurs vue par vue.
+MOTEURS = ['pandas', 'DuckDB']
+
+# Clés de période calculées sur les colonnes du magasin (mêmes clés AAAAT / AAAAMM / AAAASS que
+# moteur.deriver_periodes) ; l'export Machine n'a ni trimestre ni jour
+CLES = {
+    'Année': '"Année"',
+    'Trimestre': '"Année" * 10 + ("Mois" - 1) // 3 + 1',
+    'Mois': '"Année" * 100 + "Mois"',
+    'Semaine': '"Année" * 100 + "Semaine"',
+    'Jour': '"Jour"',
+}
+
+# Les mesures sont lues en float32 comme les types compacts (memoire.py) puis sommées en float64 :
+# les deux moteurs additionnent les mêmes valeurs
+MESURE = 'CAST("{}" AS FLOAT)'
+
+_connexion = None
+_verrou = threading.Lock()
+
+
+# DuckDB est optionnel : sans lui, seul le moteur pandas (faits en mémoire) est proposé. Sa présence
+# est vérifiée sans l'importer (il n'est importé qu'à la première requête, pas au démarrage des pages)
+def duckdb_disponible():
+    return importlib.util.find_spec('duckdb') is not None
+
+
+def moteurs():
+    return MOTEURS if duckdb_disponible() else MOTEURS[:1]
+
+
+# Curseur sur la base DuckDB en mémoire du processus (un curseur par requête : les sessions
+# Streamlit interrogent la même base en parallèle)
+def curseur():
+    global _connexion
+    with _verrou:
+        if _connexion is None:
+            import duckdb
+            _connexion = duckdb.connect(':memory:', config={'threads': os.cpu_count() or 1})
+        return _connexion.cursor()
+
+
+# Fichiers Parquet d'un magasin, avec les colonnes de partition Site et Année
+def source(magasin):
+    fichiers = os.path.join(magasin, '**', '*.parquet').replace("'", "''")
+    return f"read_parquet('{fichiers}', hive_partitioning = true, hive_types = {{'Site': VARCHAR, 'Année': INTEGER}})"
+
+
+def _dans(colonne, valeurs, parametres):
+    parametres.extend(valeurs)
+    return f'{colonne} IN ({", ".join("?" * len(valeurs))})' if valeurs else 'false'
+
+
+# Clause WHERE et paramètres d'une sélection (None = tous) : les conditions sur Site et Année
+# élaguent les partitions, la plage porte sur la clé de la période
+def conditions(sites=None, machines=None, annees=None, periode=None, plage=None, exclues=()):
+    clauses, parametres = [], []
+    if sites is not None:
+        clauses.append(_dans('"Site"', list(sites), parametres))
+    if annees is not None:
+        clauses.append(_dans('"Année"', [int(annee) for annee in annees], parametres))
+    if machines is not None:
+        clauses.append(_dans('"Machine"', list(machines), parametres))
+    if exclues:
+        clauses.append(f'"Machine" NOT IN ({", ".join("?" * len(exclues))})')
+        parametres.extend(exclues)
+    if periode is not None:
+        clauses.append(f'{CLES[periode]} IS NOT NULL')
+        if plage is not None:
+            clauses.append(f'{CLES[periode]} BETWEEN ? AND ?')
+            parametres.extend(pd.Timestamp(borne).to_pydatetime() if periode == 'Jour' else int(borne) for borne in plage)
+    return ' AND '.join(clauses) or 'true', parametres
+
+
+# Lignes retenues d'un magasin, avec la clé de la période demandée (calculée avant le regroupement :
+# elle peut porter le nom d'une colonne du magasin) et les colonnes utiles
+def lignes_magasin(magasin, periode, colonnes, where):
+    cle = f'{CLES[periode]} AS "{periode}", ' if periode is not None else ''
+    return f'(SELECT {cle}{", ".join(colonnes)} FROM {source(magasin)} WHERE {where})'
+
+
+def executer(requete, parametres=()):
+    return curseur().execute(requete, list(parametres)).df()
+
+
+# Types des clés de période, des sites et des machines du moteur pandas
+def typer(df, periodes=()):
+    types = {periode: CALENDRIER[periode] for periode in periodes}
+    types.update({nom: 'category' for nom in ('Site', 'Machine') if nom in df.columns})
+    return df.astype(types)
+
+
+# Sommes par période et par site et sommes par période (tous sites) d'une granularité, en une seule
+# lecture du magasin (GROUPING SETS)
+def sommes_sites(magasin, periode, annees=None):
+    where, parametres = conditions(annees=annees, periode=periode)
+    sommes = ', '.join(f'coalesce(sum({MESURE.format(mesure)}), 0) AS "{mesure}"' for mesure in SOMMES)
+    lignes = lignes_magasin(magasin, periode, ['"Site"'] + [f'"{mesure}"' for mesure in SOMMES], where)
+    df = executer(f'SELECT "{periode}", "Site", {sommes} FROM {lignes} '
+                  f'GROUP BY GROUPING SETS (("{periode}", "Site"), ("{periode}")) ORDER BY "{periode}", "Site"', parametres)
+    df[periode] = df[periode].astype(CALENDRIER[periode])
+    est_total = df['Site'].isna()
+    return (df[~est_total].reset_index(drop=True),
+            df.loc[est_total, [periode] + SOMMES].reset_index(drop=True))
+
+
+# Cube période × site de la page principale (mêmes tables que faits.cube_faits), agrégé par DuckDB
+# sur le magasin Global
+def cube_sql(magasin, annees=None, periodes=PERIODES):
+    return assembler_cube({periode: sommes_sites(magasin, periode, annees) for periode in periodes})
+
+
+# Ratio gaz / PE par période, machine et site des machines suivies (voir moteur.ratio_machines) :
+# gaz des lignes où PE > 0 et PE des lignes où gaz > 0, les groupes sans l'une de ces lignes écartés
+def ratio_machines_sql(magasin, periode, annees=None, sites=None, machines=MACHINES_SUIVIES, plage=None):
+    where, parametres = conditions(sites, machines, annees, periode, plage)
+    sommes = ', '.join(f'coalesce(sum({MESURE.format(mesure)}) FILTER (WHERE "{condition}" > 0), 0) AS "{nom}"'
+                       for nom, (mesure, condition) in SOMMES_MACHINE.items())
+    retenues = ' AND '.join(f'count(*) FILTER (WHERE "{condition}" > 0) > 0' for mesure, condition in SOMMES_MACHINE.values())
+    lignes = lignes_magasin(magasin, periode, ['"Site"', '"Machine"', '"Gaz (kWh)"', '"PE (kg)"'], where)
+    df = executer(f'SELECT "{periode}", "Site", "Machine", {sommes} FROM {lignes} '
+                  f'GROUP BY ALL HAVING {retenues} ORDER BY "{periode}", "Machine", "Site"', parametres)
+    df['Gaz (kWh/kg)'] = df['Gaz (kWh)'] / df['PE (kg)']
+    return typer(df[[periode, 'Site', 'Machine', 'Gaz (kWh/kg)']], [periode])
+
+
+# Lignes de machine d'une sélection (colonnes de faits.lignes), pour le modèle gaz / PE
+def lignes_sql(magasin, sites=None, machines=None, annees=None, periode=None, plage=None):
+    where, parametres = conditions(sites, machines, annees, periode, plage, exclues=[MACHINE_DOUBLON])
+    df = executer(f'SELECT "Site", "Machine", "Année", {CLES["Mois"]} AS "Mois", {CLES["Semaine"]} AS "Semaine", '
+                  f'{MESURE.format("Gaz (kWh)")} AS "Gaz (kWh)", {MESURE.format("PE (kg)")} AS "PE (kg)" '
+                  f'FROM {source(magasin)} WHERE {where} ORDER BY "Site"', parametres)
+    return typer(df, ['Année', 'Mois', 'Semaine'])
+
+
+# Somme d'un indicateur par période et machine d'une sélection
+def sommes_machines_sql(magasin, indicateur, periode, plage, sites=None, machines=None, annees=None):
+    where, parametres = conditions(sites, machines, annees, periode, plage, exclues=[MACHINE_DOUBLON])
+    lignes = lignes_magasin(magasin, periode, ['"Machine"', f'"{indicateur}"'], where)
+    df = executer(f'SELECT "{periode}", "Machine", coalesce(sum({MESURE.format(indicateur)}), 0) AS "{indicateur}" '
+                  f'FROM {lignes} GROUP BY ALL ORDER BY "{periode}", "Machine"', parametres)
+    return typer(df, [periode])
+
+
+# Vue de la page Machine calculée par DuckDB (mêmes résultats que moteur.agreger_machines) : la
+# sélection de site et de machine et la plage sont appliquées dans la requête
+def agreger_machines_sql(magasin, site, machine, indicateur, periode, plage, annees=None, coefficients=None, ratios_semaine=None):
+    sites = None if site == 'Global' else [site]
+    if indicateur in ('Gaz (kWh/kg)', PREDICTION):
+        machines = MACHINES_SUIVIES if machine == 'Global' else [m for m in MACHINES_SUIVIES if m == machine]
+        if indicateur == PREDICTION:
+            return predire(lignes_sql(magasin, sites, machines, annees, periode, plage), coefficients, periode)
+        if periode == 'Semaine' and ratios_semaine is not None:
+            df_filtered = ratios_semaine
+            if site != 'Global':
+                df_filtered = df_filtered[df_filtered['Site'] == site]
+            if machine != 'Global':
+                df_filtered = df_filtered[df_filtered['Machine'] == machine]
+            return filtrer_plage(df_filtered, periode, plage)
+        return ratio_machines_sql(magasin, periode, annees, sites, machines, plage)
+    machines = None if machine == 'Global' else [machine]
+    return sommes_machines_sql(magasin, indicateur, periode, plage, sites, machines, annees)
+
+
+# Écart relatif maximal entre les valeurs de deux tables de mêmes colonnes
+def ecart(table, reference):
+    if len(table) != len(reference):
+        return np.inf
+    ecarts = [0.0]
+    for colonne in table.columns:
+        if pd.api.types.is_float_dtype(table[colonne]):
+            valeurs, attendues = table[colonne].to_numpy(), reference[colonne].to_numpy()
+            finies = np.isfinite(valeurs) & np.isfinite(attendues)
+            if not np.array_equal(finies, np.isfinite(attendues)):
+                return np.inf
+            ecarts.append(np.max(np.abs(valeurs[finies] - attendues[finies]) / np.maximum(np.abs(attendues[finies]), 1e-12), initial=0.0))
+        elif not table[colonne].astype(str).reset_index(drop=True).equals(reference[colonne].astype(str).reset_index(drop=True)):
+            return np.inf
+    return max(ecarts)
+
+
+def chronometrer(calculer):
+    debut = time.perf_counter()
+    resultat = calculer()
+    return resultat, time.perf_counter() - debut
+
+
+# Comparaison des deux moteurs sur les magasins courants (durées et écart relatif maximal) :
+# python requetes.py [--annees 2023 2024 2025]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comparaison des moteurs pandas et DuckDB sur les magasins courants")
+    parser.add_argument('--annees', type=int, nargs='*')
+    args = parser.parse_args()
+
+    magasin_sites, magasin_machines = magasin_initialise('Global'), magasin_initialise('Machine')
+    faits, duree_faits = chronometrer(lambda: charger_faits(magasin_sites, magasin_machines))
+    print(f"Faits en mémoire (moteur pandas) : {duree_faits:.2f} s")
+
+    cube, duree_pandas = chronometrer(lambda: cube_faits(faits, args.annees))
+    cube_duckdb, duree_duckdb = chronometrer(lambda: cube_sql(magasin_sites, args.annees))
+    for periode in PERIODES:
+        print(f"Cube {periode:<9} écart relatif {ecart(cube_duckdb[periode], cube[periode]):.1e}")
+    print(f"Cube période × site : pandas {duree_pandas:.2f} s, DuckDB {duree_duckdb:.2f} s")
+
+    for periode in ('Année', 'Mois', 'Semaine'):
+        for indicateur in ('Gaz (kWh/kg)', 'PE (kg)'):
+            plage = (0, 10 ** 9)
+            vue, duree_pandas = chronometrer(lambda: agreger_machines(faits, 'Global', 'Global', indicateur, periode, plage, args.annees))
+            vue_duckdb, duree_duckdb = chronometrer(lambda: agreger_machines_sql(magasin_machines, 'Global', 'Global', indicateur, periode, plage, args.annees))
+            print(f"Machines {indicateur:<13} {periode:<8} pandas {duree_pandas * 1000:6.1f} ms, "
+                  f"DuckDB {duree_duckdb * 1000:6.1f} ms, écart relatif {ecart(vue_duckdb.reset_index(drop=True), vue.reset_index(drop=True)):.1e}")
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import toml
+
+# Mémoïsation des vues calculées dans l'état d'une session (st.session_state ou tout dictionnaire) :
+# les dernières vues affichées (données groupées, figure, tableau) sont gardées par clé de sélection,
+# revenir à une sélection déjà vue ne recalcule rien. Les plus anciennes vues sont oubliées au-delà
+# de ENTREES_SESSION.
+ENTREES_SESSION = 24
+
+CLE_VUES = 'vues'
+CLE_COMPTEURS = 'vues_compteurs'
+
+
+def compteurs(etat):
+    if CLE_COMPTEURS not in etat:
+        etat[CLE_COMPTEURS] = {'Succès': 0, 'Échecs': 0}
+    return etat[CLE_COMPTEURS]
+
+
+# Vue d'une clé de sélection : servie depuis la session si elle y est, sinon calculée puis gardée
+def vue(etat, cle, calculer, entrees=ENTREES_SESSION):
+    if CLE_VUES not in etat:
+        etat[CLE_VUES] = OrderedDict()
+    vues, compte = etat[CLE_VUES], compteurs(etat)
+    if cle in vues:
+        vues.move_to_end(cle)
+        compte['Succès'] += 1
+        return vues[cle]
+    compte['Échecs'] += 1
+    vues[cle] = calculer()
+    while len(vues) > entrees:
+        vues.popitem(last=False)
+    return vues[cle]
+
+
+# Compteurs et taille du cache de session, pour le panneau de diagnostic
+def etat_cache(etat):
+    compte = compteurs(etat)
+    total = compte['Succès'] + compte['Échecs']
+    return {**compte, 'Taux de succès (%)': round(100 * compte['Succès'] / total, 1) if total else 0.0,
+            'Vues gardées': len(etat.get(CLE_VUES, ())), 'Capacité': ENTREES_SESSION}
+
+
+# Cache des vues partagé par toutes les sessions du processus : la première session qui affiche une
+# vue la calcule, les suivantes la reprennent. Chaque page (espace) a sa génération, la version de son
+# export : un nouvel export vide les vues de la page. Les vues expirent après duree_vie_s secondes et
+# les moins récemment servies sont évincées au-delà de plafond_mo Mo.
+PLAFOND_MO = 256
+DUREE_VIE_S = 3600
+
+# Section [cache] de la configuration Streamlit, qui peut remplacer le plafond et la durée de vie
+FICHIER_CONFIG = '.streamlit/config.toml'
+
+_partage = {'generations': {}, 'vues': OrderedDict(), 'calculs': {}, 'octets': 0,
+            'Succès': 0, 'Échecs': 0, 'Expirations': 0, 'Évictions': 0}
+_verrou = threading.Lock()
+
+
+# Plafond mémoire (Mo) et durée de vie (s) du cache des vues partagé entre les sessions
+def config_cache(chemin=FICHIER_CONFIG):
+    config = toml.load(chemin).get('cache', {})
+    return config.get('vues_partagees_mo', PLAFOND_MO), config.get('vues_partagees_duree_s', DUREE_VIE_S)
+
+
+# Taille estimée d'une vue (octets) : tables en mémoire et figure sérialisée
+def taille_vue(valeur):
+    if isinstance(valeur, tuple):
+        return sum(taille_vue(element) for element in valeur)
+    if isinstance(valeur, pd.DataFrame):
+        return int(valeur.memory_usage(deep=True).sum())
+    if hasattr(valeur, 'to_json'):
+        return len(valeur.to_json())
+    return 0
+
+
+def _retirer(cle):
+    octets, _, _ = _partage['vues'].pop(cle)
+    _partage['octets'] -= octets
+
+
+# Appelé sous le verrou : vues de l'espace supprimées si sa génération a changé
+def _changer_generation(espace, generation):
+    if _partage['generations'].get(espace) != generation:
+        for cle in [cle for cle in _partage['vues'] if cle[0] == espace]:
+            _retirer(cle)
+        _partage['generations'][espace] = generation
+
+
+# Vue partagée d'une clé de sélection pour un espace et une génération : servie depuis le cache
+# du processus si elle y est encore valide, sinon calculée une seule fois (les sessions qui demandent
+# la même vue pendant le calcul l'attendent)
+def vue_partagee(espace, generation, cle, calculer, plafond_mo=PLAFOND_MO, duree_vie_s=DUREE_VIE_S):
+    cle = (espace, cle)
+    with _verrou:
+        _changer_generation(espace, generation)
+        verrou_cle = _partage['calculs'].setdefault(cle, threading.Lock())
+    with verrou_cle:
+        try:
+            with _verrou:
+                if cle in _partage['vues']:
+                    octets, date, valeur = _partage['vues'][cle]
+                    if time.monotonic() - date <= duree_vie_s:
+                        _partage['vues'].move_to_end(cle)
+                        _partage['Succès'] += 1
+                        return valeur
+                    _retirer(cle)
+                    _partage['Expirations'] += 1
+                _partage['Échecs'] += 1
+            valeur = calculer()
+            octets = taille_vue(valeur)
+            with _verrou:
+                if _partage['generations'].get(espace) == generation and octets <= plafond_mo * 2 ** 20:
+                    _partage['vues'][cle] = (octets, time.monotonic(), valeur)
+                    _partage['octets'] += octets
+                    while _partage['octets'] > plafond_mo * 2 ** 20:
+                        _retirer(next(iter(_partage['vues'])))
+                        _partage['Évictions'] += 1
+            return valeur
+        finally:
+            # Verrou de la clé retiré dans tous les cas (vue servie, calculée ou calcul en échec) :
+            # une vue dont le calcul a échoué est recalculée normalement à la demande suivante
+            with _verrou:
+                if _partage['calculs'].get(cle) is verrou_cle:
+                    del _partage['calculs'][cle]
+
+
+# Compteurs et occupation du cache partagé, pour le panneau de diagnostic
+def etat_partage():
+    with _verrou:
+        total = _partage['Succès'] + _partage['Échecs']
+        return {**{nom: _partage[nom] for nom in ('Succès', 'Échecs', 'Expirations', 'Évictions')},
+                'Taux de succès (%)': round(100 * _partage['Succès'] / total, 1) if total else 0.0,
+                'Vues gardées': len(_partage['vues']), 'Mémoire (Mo)': round(_partage['octets'] / 2 ** 20, 2)}